@@ -0,0 +1,186 @@
+from array import array
+from collections import OrderedDict
+import heapq
+import sys
+import time
+
+# Rolling windows: name -> (bucket seconds, buckets)
+WINDOWS = {
+  'hour': (300, 12),
+  'day': (3600, 24),
+  'week': (86400, 7),
+}
+
+class RingCounter:
+  # messages per user slot of the chat in fixed-size time buckets, the oldest bucket is reused for the newest period
+  __slots__ = ('bucket_seconds', 'stamps', 'totals', 'counts')
+
+  def __init__(self, bucket_seconds, buckets):
+    self.bucket_seconds = bucket_seconds
+    self.stamps = array('q', [-1]) * buckets # period each bucket belongs to
+    self.totals = array('q', [0]) * buckets # messages in the bucket
+    self.counts = [None] * buckets # messages per slot (stop at 65535), as long as the highest slot that wrote in the bucket
+
+  def add(self, slot, now):
+    period = int(now // self.bucket_seconds)
+    i = period % len(self.stamps)
+    if self.stamps[i] != period:
+      self.stamps[i] = period
+      self.totals[i] = 0
+      self.counts[i] = array('H')
+    self.totals[i] += 1
+    counts = self.counts[i]
+    if slot >= len(counts):
+      counts.extend(array('H', [0]) * (slot + 1 - len(counts)))
+    if counts[slot] < 65535:
+      counts[slot] += 1
+
+  def _live(self, now):
+    # buckets still inside the window
+    oldest = int(now // self.bucket_seconds) - len(self.stamps)
+    return [i for i, stamp in enumerate(self.stamps) if stamp > oldest]
+
+  def total(self, now):
+    return sum(self.totals[i] for i in self._live(now))
+
+  def per_slot(self, now):
+    # messages per slot in the window
+    merged = array('I')
+    for i in self._live(now):
+      counts = self.counts[i]
+      if len(counts) > len(merged):
+        merged.extend(array('I', [0]) * (len(counts) - len(merged)))
+      for slot, messages in enumerate(counts):
+        if messages:
+          merged[slot] += messages
+    return merged
+
+  def active(self, now):
+    return sum(1 for messages in self.per_slot(now) if messages)
+
+  def top(self, now, limit):
+    # [(slot, messages)]
+    active = ((slot, messages) for slot, messages in enumerate(self.per_slot(now)) if messages)
+    return heapq.nlargest(limit, active, key=lambda item: item[1])
+
+class ChatCounters:
+  # messages per user of one chat, kept in columns instead of a dict per user
+  __slots__ = ('index', 'user_ids', 'names', 'counts', 'order', 'pos', 'starts', 'windows')
+
+  def __init__(self):
+    self.index = {} # user_id -> slot
+    self.user_ids = array('q')
+    self.names = [] # interned, the same user in many chats shares one string
+    self.counts = array('q')
+    self.order = array('l') # slots, most active first
+    self.pos = array('l') # slot -> place in order
+    self.starts = {} # messages -> first place in order with that many messages
+    self.windows = {name: RingCounter(*size) for name, size in WINDOWS.items()} # recent activity by slot, memory only
+
+  def __len__(self):
+    return len(self.user_ids)
+
+  def load(self, rows):
+    # (user_id, username, messages) rows, sorted once instead of bumping one by one
+    for user_id, username, messages in rows:
+      self.index[user_id] = len(self.user_ids)
+      self.user_ids.append(user_id)
+      self.names.append(sys.intern(username or str(user_id)))
+      self.counts.append(messages)
+
+    self.order = array('l', sorted(range(len(self.counts)), key=lambda slot: -self.counts[slot]))
+    self.pos = array('l', [0]) * len(self.order)
+    self.starts = {}
+    for place, slot in enumerate(self.order):
+      self.pos[slot] = place
+      self.starts.setdefault(self.counts[slot], place)
+
+  def add(self, user_id, username, now=None):
+    # one more message, O(1): the user swaps with the first user of the same count
+    now = time.time() if now is None else now
+    slot = self.index.get(user_id)
+    if slot is None:
+      slot = len(self.user_ids)
+      self.index[user_id] = slot
+      self.user_ids.append(user_id)
+      self.names.append(sys.intern(username))
+      self.counts.append(0)
+      self.pos.append(len(self.order))
+      self.order.append(slot)
+      self.starts.setdefault(0, len(self.order) - 1)
+    elif self.names[slot] != username:
+      self.names[slot] = sys.intern(username) # renamed
+    for window in self.windows.values():
+      window.add(slot, now)
+
+    count = self.counts[slot]
+    first = self.starts[count]
+    place = self.pos[slot]
+    other = self.order[first]
+    self.order[first], self.order[place] = slot, other
+    self.pos[slot], self.pos[other] = first, place
+    self.counts[slot] = count + 1
+
+    self.starts.setdefault(count + 1, first) # otherwise the block above just grows by one
+    if first + 1 < len(self.order) and self.counts[self.order[first + 1]] == count:
+      self.starts[count] = first + 1
+    else:
+      del self.starts[count]
+
+  def find(self, username):
+    # user_id by the name we saw last, None if the user never wrote here
+    username = username.lstrip('@').lower()
+    for slot, name in enumerate(self.names):
+      if name.lower() == username:
+        return self.user_ids[slot]
+    return None
+
+  def top(self, limit, window=None):
+    # [(user_id, username, messages)], lifetime or for one of WINDOWS
+    if window is None:
+      return [(self.user_ids[slot], self.names[slot], self.counts[slot]) for slot in self.order[:limit]]
+    return [
+      (self.user_ids[slot], self.names[slot], messages)
+      for slot, messages in self.windows[window].top(time.time(), limit)
+    ]
+
+  def stats(self, window):
+    # (messages, active users) in the window
+    now = time.time()
+    ring = self.windows[window]
+    return ring.total(now), ring.active(now)
+
+class ActivityCounters:
+  # recently active chats in memory, the rest is loaded from storage on demand
+  def __init__(self, storage, max_chats=10000):
+    self.storage = storage
+    self.max_chats = max_chats
+    self.chats = OrderedDict() # chat_id -> ChatCounters, least recently used first
+
+  async def chat(self, chat_id):
+    counters = self.chats.get(chat_id)
+    if counters is None:
+      rows = await self.storage.load_activity(chat_id)
+      counters = self.chats.get(chat_id) # another update of this chat could load it meanwhile
+      if counters is None:
+        counters = ChatCounters()
+        counters.load(rows)
+        self.chats[chat_id] = counters
+        if len(self.chats) > self.max_chats:
+          self.chats.popitem(last=False) # everything is in storage already (or in its buffer)
+    else:
+      self.chats.move_to_end(chat_id)
+    return counters
+
+  async def add(self, chat_id, user_id, username):
+    (await self.chat(chat_id)).add(user_id, username)
+    self.storage.count_message(chat_id, user_id, username)
+
+  async def top(self, chat_id, limit=10, window=None):
+    return (await self.chat(chat_id)).top(limit, window)
+
+  async def stats(self, chat_id, window):
+    return (await self.chat(chat_id)).stats(window)
+
+  async def find(self, chat_id, username):
+    return (await self.chat(chat_id)).find(username)
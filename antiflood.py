@@ -0,0 +1,103 @@
+from collections import deque
+import time
+
+LINK_MARKS = ('http', 'www.', 't.me/')
+
+def digest(text):
+  return hash(' '.join(text.lower().split())) # case and spacing tricks give the same hash
+
+class FloodGuard:
+  # flood and spam detection for every group message: O(1) dict work per message, memory capped by entry counts
+  def __init__(self, max_messages=10, window=10, repeats=3, spread=8, duplicate_window=300, min_length=20,
+               max_users=100000, max_texts=50000, cooldown=60):
+    self.max_messages = max_messages # messages of one user in one chat per `window` seconds, 0 - off
+    self.window = window
+    self.repeats = repeats # the same text from one user, in any chats, per `duplicate_window`; 0 - off
+    self.spread = spread # chats the same text with a link may reach per `duplicate_window`, 0 - off
+    self.duplicate_window = duplicate_window
+    self.min_length = min_length # shorter texts without a link are never duplicates ('hi', 'ok')
+    self.max_users = max_users
+    self.max_texts = max_texts
+    self.cooldown = cooldown # seconds a flagged user is not flagged again while the mute is in flight
+    self.users = {} # (chat_id, user_id) -> deque of the times of its last max_messages + 1 messages, idle longest first
+    self.texts = {} # text hash -> [first seen, {chat_id}, {user_id: [times, chat_id of the first post, None once in a wave]}]
+    self.flagged = {} # (chat_id, user_id) -> time until which it is not flagged again
+    self.triggered = 0
+
+  def check(self, chat_id, user_id, text, now=None):
+    # None, or why the message is flood: 'flood', 'repeat' or 'spread'
+    now = time.monotonic() if now is None else now
+    key = (chat_id, user_id)
+    reason = self._rate(key, now) or self._duplicate(chat_id, user_id, text, now)
+    if not reason:
+      return None
+
+    if self.flagged.get(key, 0) > now:
+      return None # already being muted
+    if len(self.flagged) > 1000:
+      self.flagged = {flagged: until for flagged, until in self.flagged.items() if until > now}
+    self.flagged[key] = now + self.cooldown
+    self.triggered += 1
+    return reason
+
+  def _rate(self, key, now):
+    # exact sliding window: flood once max_messages + 1 messages fall within `window` seconds
+    if not self.max_messages:
+      return None
+    times = self.users.pop(key, None) # back in at the end: the first entries are the ones idle longest
+    if times is None:
+      times = deque(maxlen=self.max_messages + 1)
+      if len(self.users) >= self.max_users:
+        del self.users[next(iter(self.users))]
+    self.users[key] = times
+    times.append(now)
+    if len(times) > self.max_messages and now - times[0] < self.window:
+      return 'flood'
+    return None
+
+  def _duplicate(self, chat_id, user_id, text, now):
+    if not self.repeats and not self.spread:
+      return None
+    link = any(mark in text for mark in LINK_MARKS)
+    if len(text) < self.min_length and not link:
+      return None
+
+    text_key = digest(text)
+    entry = self.texts.get(text_key)
+    if entry is None or now - entry[0] > self.duplicate_window:
+      self.texts.pop(text_key, None)
+      entry = self.texts[text_key] = [now, set(), {}]
+      if len(self.texts) > self.max_texts:
+        del self.texts[next(iter(self.texts))]
+
+    chats, posters = entry[1], entry[2]
+    if len(chats) < self.spread:
+      chats.add(chat_id) # the set never grows past `spread`
+    poster = posters.get(user_id)
+    if poster:
+      poster[0] += 1
+    elif len(posters) < 64: # a text posted by crowds keeps only its first posters
+      poster = posters[user_id] = [1, chat_id]
+    times = poster[0] if poster else 1
+
+    if self.repeats and times >= self.repeats:
+      return 'repeat'
+    if self.spread and link and len(chats) >= self.spread:
+      return 'spread' # a link spam wave: every post of it from here on, wave() gives the accounts that started it
+    return None
+
+  def wave(self, text, now=None):
+    # [(chat_id, user_id)] who posted a 'spread' text before it was flagged, each one returned once
+    now = time.monotonic() if now is None else now
+    entry = self.texts.get(digest(text))
+    if entry is None:
+      return []
+    found = []
+    for user_id, poster in entry[2].items():
+      key = (poster[1], user_id)
+      if poster[1] is not None and self.flagged.get(key, 0) <= now:
+        self.flagged[key] = now + self.cooldown
+        found.append(key)
+      poster[1] = None
+    self.triggered += len(found)
+    return found
@@ -0,0 +1,234 @@
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import Update
+from downloads import QueueFull
+from storage import WriteBehindStorage
+import asyncio
+import itertools
+import json
+import os
+import time
+
+# Shared state for running several bot workers at once.
+# Local* classes keep everything in this process, Redis* ones share it through a Redis-compatible server.
+
+def connect_redis(url):
+  import redis.asyncio # optional dependency, only needed with STATE_BACKEND=redis
+  return redis.asyncio.from_url(url, decode_responses=True)
+
+def update_chat_id(update):
+  # chat the update belongs to (user for inline/callback updates without a chat)
+  event = update.event
+  chat = getattr(event, 'chat', None) or getattr(getattr(event, 'message', None), 'chat', None)
+  if chat:
+    return chat.id
+  user = getattr(event, 'from_user', None)
+  return user.id if user else 0
+
+class RedisStorage(WriteBehindStorage):
+  # languages in one hash, per-chat hashes for counters and usernames
+  def __init__(self, client, flush_interval=5, prefix='bot'):
+    super().__init__(flush_interval)
+    self.redis = client
+    self.prefix = prefix
+
+  async def read_languages(self):
+    return {int(chat_id): lang for chat_id, lang in (await self.redis.hgetall(f'{self.prefix}:lang')).items()}
+
+  async def read_activity(self, chat_id):
+    async with self.redis.pipeline(transaction=False) as pipe:
+      pipe.hgetall(f'{self.prefix}:activity:{chat_id}')
+      pipe.hgetall(f'{self.prefix}:names:{chat_id}')
+      counts, names = await pipe.execute()
+    return [(int(user_id), names.get(user_id), int(messages)) for user_id, messages in counts.items()]
+
+  async def read_restrictions(self):
+    rows = []
+    for field, value in (await self.redis.hgetall(f'{self.prefix}:restrictions')).items():
+      chat_id, user_id, kind = field.split(':')
+      until, name = json.loads(value)
+      rows.append((int(chat_id), int(user_id), kind, until, name))
+    return rows
+
+  async def write(self, messages, languages, restrictions):
+    # HINCRBY adds up batches of all workers, MULTI keeps one batch atomic
+    async with self.redis.pipeline(transaction=True) as pipe:
+      if languages:
+        pipe.hset(f'{self.prefix}:lang', mapping=languages)
+      for chat_id, users in messages.items():
+        for user_id, (username, count) in users.items():
+          pipe.hincrby(f'{self.prefix}:activity:{chat_id}', user_id, count)
+          pipe.hset(f'{self.prefix}:names:{chat_id}', user_id, username)
+      for (chat_id, user_id, kind), value in restrictions.items():
+        field = f'{chat_id}:{user_id}:{kind}'
+        if value is None:
+          pipe.hdel(f'{self.prefix}:restrictions', field)
+        else:
+          pipe.hset(f'{self.prefix}:restrictions', field, json.dumps(value))
+      await pipe.execute()
+
+  async def disconnect(self):
+    pass # the client is shared, closed by its owner
+
+# KEYS: waiting (ticket order), running (lease deadline), alive (last poll of waiting jobs)
+# ARGV: job, cluster limit, now, lease seconds, seconds after which a silent waiting job is dropped
+CLAIM_SCRIPT = '''
+local now = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+for _, job in ipairs(redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', now - tonumber(ARGV[5]))) do
+  redis.call('ZREM', KEYS[1], job)
+  redis.call('ZREM', KEYS[3], job)
+end
+if redis.call('ZSCORE', KEYS[1], ARGV[1]) == false then
+  return -1
+end
+redis.call('ZADD', KEYS[3], now, ARGV[1])
+if redis.call('ZCARD', KEYS[2]) >= tonumber(ARGV[2]) then
+  return 0
+end
+if redis.call('ZRANGE', KEYS[1], 0, 0)[1] ~= ARGV[1] then
+  return 0
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('ZREM', KEYS[3], ARGV[1])
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[4]), ARGV[1])
+return 1
+'''
+
+class RedisJobQueue:
+  # cluster-wide limit of running media jobs, oldest ticket first
+  # per-chat limits stay local: every chat is handled by one worker (see ShardRouter)
+  def __init__(self, client, local, cluster_workers, max_waiting=100, prefix='bot', poll=0.5, lease=1800, timeout=30):
+    self.redis = client
+    self.local = local # LocalJobQueue of this worker's pool
+    self.cluster_workers = cluster_workers # jobs running at once in all workers
+    self.max_waiting = max_waiting # cluster queue limit
+    self.poll = poll # seconds between claim attempts
+    self.lease = lease # seconds a running job keeps its slot if its worker dies
+    self.timeout = timeout # seconds a waiting job survives without polling
+    self.keys = [f'{prefix}:jobs:waiting', f'{prefix}:jobs:running', f'{prefix}:jobs:alive']
+    self.ticket_key = f'{prefix}:jobs:ticket'
+    self.claim = client.register_script(CLAIM_SCRIPT)
+    self.worker = f'{os.getpid()}-{id(self)}'
+    self.jobs = itertools.count()
+
+  def pending(self):
+    return self.local.pending()
+
+  async def position(self, chat_id):
+    position = await self.local.position(chat_id)
+    if position:
+      return position
+    if await self.redis.zcard(self.keys[1]) < self.cluster_workers:
+      return 0
+    return await self.redis.zcard(self.keys[0]) + 1
+
+  async def acquire(self, chat_id):
+    await self.local.acquire(chat_id)
+    job = f'{self.worker}:{next(self.jobs)}'
+    try:
+      if await self.redis.zcard(self.keys[0]) >= self.max_waiting:
+        raise QueueFull()
+      ticket = await self.redis.incr(self.ticket_key)
+      await self.redis.zadd(self.keys[0], {job: ticket})
+
+      while True:
+        claimed = await self.claim(keys=self.keys, args=[job, self.cluster_workers, time.time(), self.lease, self.timeout])
+        if claimed == 1:
+          return job
+        if claimed == -1:
+          await self.redis.zadd(self.keys[0], {job: await self.redis.incr(self.ticket_key)}) # dropped as silent, queue again
+        await asyncio.sleep(self.poll)
+    except BaseException:
+      await asyncio.shield(self._forget(chat_id, job))
+      raise
+
+  async def _forget(self, chat_id, job):
+    async with self.redis.pipeline(transaction=True) as pipe:
+      for key in self.keys:
+        pipe.zrem(key, job)
+      await pipe.execute()
+    await self.local.release(chat_id, None)
+
+  async def release(self, chat_id, job):
+    await self._forget(chat_id, job)
+
+  def close(self):
+    self.local.close()
+
+class LocalUpdateQueue:
+  # shards in this process (tests, a single worker)
+  def __init__(self):
+    self.queues = {}
+
+  def queue(self, shard):
+    return self.queues.setdefault(shard, asyncio.Queue())
+
+  async def push(self, shard, data):
+    await self.queue(shard).put(data)
+
+  async def pop(self, shard):
+    return await self.queue(shard).get()
+
+class RedisUpdateQueue:
+  # one list per shard
+  def __init__(self, client, prefix='bot'):
+    self.redis = client
+    self.prefix = prefix
+
+  async def push(self, shard, data):
+    await self.redis.rpush(f'{self.prefix}:updates:{shard}', data)
+
+  async def pop(self, shard):
+    while True:
+      item = await self.redis.blpop([f'{self.prefix}:updates:{shard}'], timeout=5)
+      if item:
+        return item[1]
+
+class ShardRouter(BaseMiddleware):
+  # every chat belongs to one worker (chat_id % workers), updates of other chats are passed on to their owner
+  def __init__(self, updates, worker_id=0, workers=1, concurrency=100):
+    self.updates = updates
+    self.worker_id = worker_id
+    self.workers = workers
+    self.concurrency = concurrency # routed updates processed at once
+    self.tasks = set()
+
+  def owner(self, update):
+    return update_chat_id(update) % self.workers
+
+  def owns(self, chat_id):
+    return chat_id % self.workers == self.worker_id
+
+  async def __call__(self, handler, event, data):
+    if self.workers == 1 or data.get('routed') or self.owner(event) == self.worker_id:
+      return await handler(event, data)
+    await self.updates.push(self.owner(event), event.model_dump_json(exclude_none=True, by_alias=True))
+    return UNHANDLED
+
+  async def consume(self, dp, bot):
+    # updates other workers received for our chats
+    slots = asyncio.Semaphore(self.concurrency)
+    while True:
+      data = await self.updates.pop(self.worker_id)
+      update = Update.model_validate_json(data, context={'bot': bot})
+      await slots.acquire()
+      task = asyncio.create_task(self._feed(dp, bot, update, slots))
+      self.tasks.add(task)
+      task.add_done_callback(self.tasks.discard)
+
+  async def _feed(self, dp, bot, update, slots):
+    held = True
+    def on_hold():
+      # queued behind an earlier update of its chat, the slot can serve another chat meanwhile
+      nonlocal held
+      if held:
+        held = False
+        slots.release()
+
+    try:
+      await dp.feed_update(bot, update, routed=True, on_hold=on_hold)
+    except Exception as e:
+      print(f'Update error: {e}')
+    finally:
+      on_hold()
@@ -0,0 +1,70 @@
+# Memory of activity counters: old nested dicts vs ChatCounters columns, and the columns with every window filled
+# run: python benchmarks/bench_activity_memory.py [--chats 10000] [--users 1000] [--sample 200]
+# Memory grows linearly with chats, so `sample` chats are built and the result is scaled to `chats`.
+# 'with windows' has every user writing in every bucket of the hour, day and week windows, their worst case.
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from activity import ChatCounters, WINDOWS
+
+def username(user_id):
+  # a fresh string, like one parsed from every update
+  return ''.join(['user', str(user_id)])
+
+def build_nested(chats, users):
+  data = {}
+  for chat_id in range(chats):
+    data[-1000000000000 - chat_id] = {
+      user_id: {'username': username(user_id), 'messages': user_id % 97 + 1}
+      for user_id in range(10 ** 9, 10 ** 9 + users)
+    }
+  return data
+
+def build_compact(chats, users):
+  data = {}
+  for chat_id in range(chats):
+    counters = ChatCounters()
+    counters.load((user_id, username(user_id), user_id % 97 + 1) for user_id in range(10 ** 9, 10 ** 9 + users))
+    data[-1000000000000 - chat_id] = counters
+  return data
+
+def build_windows(chats, users):
+  # one message per user in every bucket of every window
+  now = 10 ** 9
+  times = [now - i * seconds for seconds, buckets in WINDOWS.values() for i in range(buckets)]
+  data = build_compact(chats, users)
+  for counters in data.values():
+    for at in times:
+      for user_id in range(10 ** 9, 10 ** 9 + users):
+        counters.add(user_id, counters.names[counters.index[user_id]], at)
+  return data
+
+def measure(build, chats, users):
+  tracemalloc.start()
+  data = build(chats, users)
+  size = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+  del data
+  return size
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--chats', type=int, default=10000)
+  parser.add_argument('--users', type=int, default=1000)
+  parser.add_argument('--sample', type=int, default=200)
+  args = parser.parse_args()
+  sample = min(args.sample, args.chats)
+
+  print(f'{args.chats} chats x {args.users} users (measured on {sample} chats)')
+  results = {}
+  for name, build in (('nested dicts', build_nested), ('ChatCounters', build_compact), ('with windows', build_windows)):
+    size = measure(build, sample, args.users) * args.chats / sample
+    results[name] = size
+    print(f'{name:14} {size / 2 ** 20:10.1f} MiB  {size / (args.chats * args.users):6.1f} B/user')
+  print(f'saved: {1 - results["ChatCounters"] / results["nested dicts"]:.0%}, windows cost {results["with windows"] / results["ChatCounters"] - 1:.0%} more')
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,65 @@
+# Cost of the flood guard on the per-message path, and its memory once the caps are reached
+# run: python benchmarks/bench_antiflood.py [--messages 1000000] [--chats 5000] [--users 200000]
+# Messages are generated up front: short chatter, longer texts and links, with a few flooders and spammers mixed in.
+# Time is simulated at --rate messages per minute, so windows roll over like they would in production.
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from antiflood import FloodGuard
+
+WORDS = 'hello what are you doing tonight lol this is fine did you see the game yesterday'.split()
+
+def messages(count, chats, users, seed):
+  rng = random.Random(seed)
+  spam = 'Free crypto giveaway, claim now at https://example.com/claim'
+  for i in range(count):
+    roll = rng.random()
+    if roll < 0.001:
+      yield rng.randrange(chats), 1, 'flood flood' # one user flooding one chat
+    elif roll < 0.002:
+      yield rng.randrange(chats), rng.randrange(users), spam # the same link everywhere
+    elif roll < 0.1:
+      yield rng.randrange(chats), rng.randrange(users), f'look at this https://example.com/{i}'
+    else:
+      yield rng.randrange(chats), rng.randrange(users), ' '.join(rng.choices(WORDS, k=rng.randrange(1, 15)))
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--messages', type=int, default=1000000)
+  parser.add_argument('--chats', type=int, default=5000)
+  parser.add_argument('--users', type=int, default=200000)
+  parser.add_argument('--rate', type=int, default=30000) # messages per minute
+  parser.add_argument('--seed', type=int, default=1)
+  args = parser.parse_args()
+
+  batch = list(messages(args.messages, args.chats, args.users, args.seed))
+  step = 60 / args.rate
+  guard = FloodGuard(max_users=100000, max_texts=50000)
+
+  tracemalloc.start()
+  start = time.perf_counter()
+  for i, (chat_id, user_id, text) in enumerate(batch):
+    guard.check(chat_id, user_id, text, i * step)
+  elapsed = time.perf_counter() - start
+  _, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+
+  print(f'{args.messages} messages, {args.chats} chats, {args.users} users, {args.rate} per minute (simulated)')
+  print(f'per message   {elapsed / args.messages * 1e6:6.2f} us (with tracemalloc on)')
+  print(f'flagged       {guard.triggered}')
+  print(f'entries       users {len(guard.users)} / {guard.max_users}, texts {len(guard.texts)} / {guard.max_texts}')
+  print(f'peak memory   {peak / 2 ** 20:6.1f} MB')
+
+  guard = FloodGuard(max_users=100000, max_texts=50000)
+  start = time.perf_counter()
+  for i, (chat_id, user_id, text) in enumerate(batch):
+    guard.check(chat_id, user_id, text, i * step)
+  print(f'per message   {(time.perf_counter() - start) / args.messages * 1e6:6.2f} us (plain)')
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,242 @@
+# Throughput of the whole bot: synthetic updates through dp.feed_update against a fake Bot API, no network
+# run: python benchmarks/bench_dispatcher.py [--updates 2000] [--concurrency 100] [--scenario chatter ...]
+#      [--api-ms 0] [--weather-ms 20] [--download-ms 50] [--real-limits] [--save base.json] [--compare base.json]
+# Handlers, middlewares, the outbox, storage, caches and the download pool are the real ones; Telegram, the weather API,
+# yt-dlp probes and downloads are stubs. Outbox rate limits are lifted unless --real-limits, so the numbers are the bot's
+# own cost. --compare exits with 1 when a scenario got slower than the saved run by more than --tolerance.
+from aiohttp import web
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+from bot import Config, create_app
+import bot.routers.media as media_handlers
+import probe
+from fake_api import ADMIN_ID, FakeSession, message_update, fake_download_song, fake_download_tiktok, fake_probe_media
+
+CHATS = [-1000000000000 - i for i in range(200)]
+WORDS = 'hello what are you doing tonight lol this is fine did you see the game yesterday'.split()
+
+def config(directory, args, weather_port):
+  limits = {} if args.real_limits else {
+    'api_global_rate': 1e9, 'private_chat_rate': 1e9, 'group_chat_rate': 1e9, 'moderation_chat_rate': 1e9,
+    'download_queue_size': 100000,
+  }
+  return Config(
+    token='1:bench',
+    db_path=os.path.join(directory, 'bot.db'),
+    media_cache_db=os.path.join(directory, 'media_cache.db'),
+    media_dir=os.path.join(directory, 'media'),
+    metrics_port=0,
+    weather_api_key='bench',
+    weather_base_url=f'http://127.0.0.1:{weather_port}',
+    **limits,
+  )
+
+async def start_weather_api(latency):
+  # Visual Crossing lookalike
+  async def today(request):
+    await asyncio.sleep(latency)
+    place = request.match_info['location'].title()
+    return web.json_response({
+      'resolvedAddress': place,
+      'currentConditions': {'temp': 12.5, 'conditions': 'Partially cloudy', 'windspeed': 9.4},
+    })
+
+  app = web.Application()
+  app.router.add_get('/{location}/today', today)
+  runner = web.AppRunner(app, access_log=None)
+  await runner.setup()
+  site = web.TCPSite(runner, '127.0.0.1', 0)
+  await site.start()
+  return runner, site._server.sockets[0].getsockname()[1]
+
+# Scenarios: rng -> one update
+def chatter(rng):
+  user_id = rng.randrange(100, 2100)
+  return message_update(' '.join(rng.choices(WORDS, k=rng.randrange(1, 12))), rng.choice(CHATS), user_id)
+
+def moderation(rng):
+  command = rng.choice(('/mute 10m', '/mute 1y', '/unmute', '/kick', '/ban', '/unban'))
+  user_id = ADMIN_ID if rng.random() < 0.8 else rng.randrange(100, 2100) # some users try it without rights
+  return message_update(command, rng.choice(CHATS), user_id, reply_to=rng.randrange(100, 2100))
+
+def weather(rng):
+  place = f'city{rng.randrange(50) if rng.random() < 0.8 else rng.randrange(50, 1000)}' # a few popular places
+  return message_update(f'/weather {place}', rng.choice(CHATS), rng.randrange(100, 2100))
+
+def media(rng):
+  chat_id, user_id = rng.choice(CHATS), rng.randrange(100, 2100)
+  item = rng.randrange(20) if rng.random() < 0.5 else rng.randrange(20, 10 ** 9) # half are cached after the first time
+  if rng.random() < 0.5:
+    return message_update(f'/song track {item}', chat_id, user_id)
+  return message_update(f'look https://www.tiktok.com/@someone/video/{item}', chat_id, user_id)
+
+def mixed(rng):
+  return rng.choices((chatter, moderation, weather, media), weights=(85, 5, 5, 5))[0](rng)
+
+SCENARIOS = {'chatter': chatter, 'moderation': moderation, 'weather': weather, 'media': media, 'mixed': mixed}
+
+class LagProbe:
+  # how late a short sleep wakes up, sampled all the time the scenario runs
+  def __init__(self, interval=0.01):
+    self.interval = interval
+    self.samples = []
+    self.task = None
+
+  async def run(self):
+    loop = asyncio.get_running_loop()
+    while True:
+      start = loop.time()
+      await asyncio.sleep(self.interval)
+      self.samples.append(max(loop.time() - start - self.interval, 0.0))
+
+  def __enter__(self):
+    self.task = asyncio.create_task(self.run())
+    return self
+
+  def __exit__(self, *exc):
+    self.task.cancel()
+
+def percentile(values, q):
+  if not values:
+    return 0.0
+  values = sorted(values)
+  return values[min(int(q * len(values)), len(values) - 1)]
+
+async def drive(app, updates, concurrency):
+  # up to `concurrency` updates in flight, like polling or the webhook server
+  latencies = []
+  errors = 0
+  slots = asyncio.Semaphore(concurrency)
+  tasks = set()
+
+  async def feed(update):
+    nonlocal errors
+    start = time.perf_counter()
+    held = True
+    def on_hold():
+      # the webhook server frees the slot of an update queued behind its chat
+      nonlocal held
+      if held:
+        held = False
+        slots.release()
+
+    try:
+      await app.dp.feed_update(app.bot, update, on_hold=on_hold)
+    except Exception:
+      errors += 1
+    finally:
+      latencies.append(time.perf_counter() - start)
+      on_hold()
+
+  start = time.perf_counter()
+  with LagProbe() as lag:
+    for update in updates:
+      await slots.acquire()
+      task = asyncio.create_task(feed(update))
+      tasks.add(task)
+      task.add_done_callback(tasks.discard)
+    await asyncio.gather(*tasks)
+  elapsed = time.perf_counter() - start
+  return {
+    'updates': len(updates),
+    'rate': len(updates) / elapsed,
+    'p50': percentile(latencies, 0.5),
+    'p99': percentile(latencies, 0.99),
+    'lag_p99': percentile(lag.samples, 0.99),
+    'lag_max': max(lag.samples, default=0.0),
+    'errors': errors,
+  }
+
+def compare(results, baseline, tolerance):
+  # scenarios that got slower than the saved run
+  regressions = []
+  for name, result in results.items():
+    base = baseline.get(name)
+    if not base:
+      continue
+    if result['rate'] < base['rate'] * (1 - tolerance):
+      regressions.append(f'{name}: {result["rate"]:.0f} updates/s, was {base["rate"]:.0f}')
+    if result['p99'] > base['p99'] * (1 + tolerance) + 0.001: # 1 ms of noise
+      regressions.append(f'{name}: p99 {result["p99"] * 1000:.1f} ms, was {base["p99"] * 1000:.1f}')
+  return regressions
+
+async def bench(args, directory):
+  weather_runner, weather_port = await start_weather_api(args.weather_ms / 1000)
+  os.environ['BENCH_DOWNLOAD_MS'] = str(args.download_ms) # read by the stubs in the pool processes
+  probe.probe_media = fake_probe_media # the prober cache and threads stay real
+  media_handlers.download_song = fake_download_song
+  media_handlers.download_tiktok = fake_download_tiktok
+
+  session = FakeSession(args.api_ms / 1000)
+  app = create_app(config(directory, args, weather_port), session)
+  await app.dp.emit_startup(bot=app.bot)
+
+  rng = random.Random(args.seed)
+  results = {}
+  try:
+    await drive(app, [mixed(rng) for _ in range(args.warmup)], args.concurrency) # imports, pool processes, caches
+    for name in args.scenario:
+      calls = sum(session.calls.values())
+      result = await drive(app, [SCENARIOS[name](rng) for _ in range(args.updates)], args.concurrency)
+      result['api_calls'] = sum(session.calls.values()) - calls
+      results[name] = result
+  finally:
+    await app.dp.emit_shutdown(bot=app.bot)
+    await weather_runner.cleanup()
+  return results
+
+def report(results):
+  print(f'{"scenario":<12}{"updates":>8}{"upd/s":>9}{"p50 ms":>9}{"p99 ms":>9}{"lag p99":>9}{"lag max":>9}{"api":>7}{"errors":>7}')
+  for name, r in results.items():
+    print(
+      f'{name:<12}{r["updates"]:>8}{r["rate"]:>9.0f}{r["p50"] * 1000:>9.2f}{r["p99"] * 1000:>9.2f}'
+      f'{r["lag_p99"] * 1000:>9.2f}{r["lag_max"] * 1000:>9.2f}{r["api_calls"]:>7}{r["errors"]:>7}'
+    )
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--updates', type=int, default=2000) # per scenario
+  parser.add_argument('--warmup', type=int, default=200)
+  parser.add_argument('--concurrency', type=int, default=100) # updates in flight, WEBHOOK_CONCURRENCY
+  parser.add_argument('--scenario', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+  parser.add_argument('--api-ms', type=float, default=0) # Bot API answer time
+  parser.add_argument('--weather-ms', type=float, default=20) # weather API answer time
+  parser.add_argument('--download-ms', type=float, default=50) # time of a stubbed download
+  parser.add_argument('--real-limits', action='store_true') # keep the outbox rates and the download queue limit
+  parser.add_argument('--seed', type=int, default=1)
+  parser.add_argument('--save') # write the results as a baseline
+  parser.add_argument('--compare') # baseline to check against
+  parser.add_argument('--tolerance', type=float, default=0.25) # allowed slowdown
+  args = parser.parse_args()
+
+  directory = tempfile.mkdtemp(prefix='bench_dispatcher_')
+  try:
+    results = asyncio.run(bench(args, directory))
+  finally:
+    shutil.rmtree(directory, ignore_errors=True)
+
+  report(results)
+  if args.save:
+    with open(args.save, 'w') as f:
+      json.dump(results, f, indent=2)
+  if args.compare:
+    with open(args.compare) as f:
+      regressions = compare(results, json.load(f), args.tolerance)
+    for line in regressions:
+      print(f'regression: {line}')
+    if regressions:
+      sys.exit(1)
+
+if __name__ == '__main__':
+  main()
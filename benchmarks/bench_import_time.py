@@ -0,0 +1,68 @@
+# Cold start of the bot: time to import it and build the app in a fresh interpreter, and which heavy modules got loaded
+# run: python benchmarks/bench_import_time.py [--runs 5] [--top 15]
+# Every run is a new process, so nothing is cached but the .pyc files (the first run writes them and is not counted).
+# --top lists the slowest imports (cumulative, from python -X importtime) of the last run.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ('yt_dlp', 'aiohttp.web', 'redis') # should only be loaded by the code that uses them
+
+STARTUP = '''
+import json, sys, time
+start = time.perf_counter()
+import bot
+imported = time.perf_counter()
+bot.create_app(bot.Config(token='1:bench', metrics_port=0))
+created = time.perf_counter()
+print(json.dumps({
+  'import': imported - start,
+  'create_app': created - imported,
+  'heavy': [name for name in %r if name in sys.modules],
+}))
+''' % (HEAVY,)
+
+def run(directory, importtime=False):
+  # the app's databases and media directory land in the temporary working directory
+  command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', STARTUP]
+  env = {**os.environ, 'PYTHONPATH': ROOT}
+  result = subprocess.run(command, cwd=directory, env=env, capture_output=True, text=True, check=True)
+  return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+def slowest(importtime_log, limit):
+  # [(cumulative seconds, module)], a package includes the modules it imports
+  rows = []
+  for line in importtime_log.splitlines():
+    if not line.startswith('import time:') or 'cumulative' in line:
+      continue
+    _, cumulative, module = line.split('|')
+    rows.append((int(cumulative) / 1e6, module.strip()))
+  return sorted(rows, reverse=True)[:limit]
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--runs', type=int, default=5)
+  parser.add_argument('--top', type=int, default=15)
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory(prefix='bench_import_') as directory:
+    run(directory) # writes the .pyc files
+    results = [run(directory)[0] for _ in range(args.runs)]
+    _, importtime_log = run(directory, importtime=True)
+
+  for key in ('import', 'create_app'):
+    values = [result[key] for result in results]
+    print(f'{key:<12} median {statistics.median(values) * 1000:8.1f} ms   min {min(values) * 1000:8.1f} ms')
+  print(f'heavy modules loaded: {", ".join(results[-1]["heavy"]) or "none"}')
+  if args.top:
+    print('\nslowest imports (cumulative):')
+    for seconds, module in slowest(importtime_log, args.top):
+      print(f'  {seconds * 1000:8.1f} ms  {module}')
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,113 @@
+# End-to-end time and peak disk usage of /song pipelines, without the network
+# run: python benchmarks/bench_song_pipeline.py [--seconds 240]  (needs ffmpeg in PATH)
+# A source file like the one yt-dlp downloads is generated once, then each pipeline turns it into upload
+# bytes. The upload is a reader that drops the chunks, so the numbers are the bot's own cost.
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from media_stream import audio_file
+
+SOURCES = {
+  'opus': ('webm', ['-codec:a', 'libopus', '-b:a', '160k']), # what bestaudio usually is
+  'm4a': ('m4a', ['-codec:a', 'aac', '-b:a', '128k']),
+}
+
+def make_source(directory, seconds, codec):
+  ext, args = SOURCES[codec]
+  path = os.path.join(directory, f'source.{ext}')
+  subprocess.run(
+    ['ffmpeg', '-nostdin', '-loglevel', 'error', '-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}', *args, path],
+    check=True,
+  )
+  return path
+
+def disk_usage(directory):
+  total = 0
+  for entry in os.scandir(directory):
+    try:
+      total += entry.stat().st_size
+    except OSError:
+      pass
+  return total
+
+class PeakDisk:
+  # samples the job directory while a pipeline runs
+  def __init__(self, directory):
+    self.directory = directory
+    self.peak = 0
+    self.done = threading.Event()
+    self.thread = threading.Thread(target=self.run)
+
+  def run(self):
+    while not self.done.is_set():
+      self.peak = max(self.peak, disk_usage(self.directory))
+      time.sleep(0.005)
+
+  def __enter__(self):
+    self.thread.start()
+    return self
+
+  def __exit__(self, *exc):
+    self.done.set()
+    self.thread.join()
+    self.peak = max(self.peak, disk_usage(self.directory))
+
+async def upload(input_file):
+  sent = 0
+  async for chunk in input_file.read(None):
+    sent += len(chunk)
+  return sent
+
+async def files_pipeline(source, directory):
+  # the old way: FFmpegExtractAudio writes an mp3 next to the source, then FSInputFile reads it back
+  mp3 = os.path.join(directory, 'song.mp3')
+  process = await asyncio.create_subprocess_exec(
+    'ffmpeg', '-nostdin', '-loglevel', 'error', '-i', source, '-vn', '-codec:a', 'libmp3lame', '-b:a', '192k', mp3,
+  )
+  await process.wait()
+  return await upload(audio_file(mp3))
+
+async def stream_pipeline(source, directory):
+  return await upload(audio_file(source))
+
+def run(name, pipeline, template):
+  directory = tempfile.mkdtemp(prefix='bench_song_')
+  try:
+    source = shutil.copy(template, directory) # the downloaded file is part of the disk usage
+    with PeakDisk(directory) as disk:
+      start = time.perf_counter()
+      sent = asyncio.run(pipeline(source, directory))
+      elapsed = time.perf_counter() - start
+    print(f'{name:<22} {elapsed * 1000:8.0f} ms  peak disk {disk.peak / 2 ** 20:6.1f} MiB  uploaded {sent / 2 ** 20:5.1f} MiB')
+  finally:
+    shutil.rmtree(directory, ignore_errors=True)
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--seconds', type=int, default=240) # song length
+  args = parser.parse_args()
+
+  if not shutil.which('ffmpeg'):
+    sys.exit('ffmpeg not found in PATH')
+
+  templates = tempfile.mkdtemp(prefix='bench_song_src_')
+  try:
+    for codec in SOURCES:
+      template = make_source(templates, args.seconds, codec)
+      print(f'{codec} source, {args.seconds} s, {os.path.getsize(template) / 2 ** 20:.1f} MiB')
+      run('files (mp3 on disk)', files_pipeline, template)
+      run('stream', stream_pipeline, template)
+      print()
+  finally:
+    shutil.rmtree(templates, ignore_errors=True)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,35 @@
+# Per-call cost of tr(): the old dict literal rebuilt on every call vs the table built at import
+# run: python benchmarks/bench_tr.py
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from i18n import TRANSLATIONS, LANGUAGES, translate
+
+def build_old_tr():
+  # same shape as the old tr(): {key: {lang: text}} literal inside the function body
+  nested = {}
+  for (key, lang), text in TRANSLATIONS.items():
+    nested.setdefault(key, {})[lang] = text
+  source = (
+    'def old_tr(lang, key):\n'
+    f'  translation = {nested!r}\n'
+    '  return translation.get(key, {}).get(lang, key)\n'
+  )
+  namespace = {}
+  exec(source, namespace)
+  return namespace['old_tr']
+
+def main():
+  old_tr = build_old_tr()
+  keys = ['temp', 'conditions', 'wind', 'weather_error']
+  calls = 20000
+
+  for name, func in (('before (literal per call)', old_tr), ('after (flat table)', translate)):
+    for lang in LANGUAGES:
+      seconds = min(timeit.repeat(lambda: [func(lang, key) for key in keys], number=calls // len(keys), repeat=5))
+      print(f'{name:28} {lang}: {seconds / calls * 1e6:8.3f} us/call')
+
+if __name__ == '__main__':
+  main()
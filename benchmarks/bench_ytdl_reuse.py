@@ -0,0 +1,85 @@
+# Per-request overhead of yt-dlp: a fresh YoutubeDL per job (old) vs the long-lived instances of ytdl.Downloaders
+# run: python benchmarks/bench_ytdl_reuse.py [--jobs 50] [--cookies 2000]
+# Every job downloads a small file from a local HTTP server through process_ie_result (what a probed job does),
+# with a cookie file like the TikTok one, so the difference is instance setup, cookie parsing/saving and connections.
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import functools
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from yt_dlp import YoutubeDL
+from ytdl import PROFILES, Downloaders
+
+class Handler(SimpleHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1' # keep-alive, like a CDN
+
+  def log_message(self, *args):
+    pass
+
+def write_cookies(path, count):
+  with open(path, 'w') as f:
+    f.write('# Netscape HTTP Cookie File\n')
+    for i in range(count):
+      f.write(f'.example{i % 50}.com\tTRUE\t/\tTRUE\t2147483647\tcookie{i}\t{"v" * 64}\n')
+
+def info(port):
+  return {
+    'id': 'bench', 'title': 'bench', 'extractor': 'generic', 'extractor_key': 'Generic',
+    'webpage_url': f'http://127.0.0.1:{port}/',
+    'formats': [{'format_id': 'a', 'url': f'http://127.0.0.1:{port}/media.m4a', 'ext': 'm4a', 'acodec': 'aac', 'vcodec': 'none'}],
+  }
+
+def fresh(opts, port, outtmpl):
+  with YoutubeDL({**opts, 'outtmpl': outtmpl}) as ydl:
+    ydl.process_ie_result(info(port), download=True)
+
+def reused(downloaders, port, outtmpl):
+  with downloaders.use('bench', outtmpl) as ydl:
+    ydl.process_ie_result(info(port), download=True)
+
+def measure(name, job, jobs, directory):
+  start = time.perf_counter()
+  for i in range(jobs):
+    job(os.path.join(directory, f'{name}{i}.%(ext)s'))
+  elapsed = time.perf_counter() - start
+  print(f'{name:<8} {elapsed / jobs * 1000:7.1f} ms per job')
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--jobs', type=int, default=50)
+  parser.add_argument('--cookies', type=int, default=2000) # lines in the cookie file
+  parser.add_argument('--size', type=int, default=64) # KiB per download
+  args = parser.parse_args()
+
+  directory = tempfile.mkdtemp(prefix='bench_ytdl_')
+  try:
+    with open(os.path.join(directory, 'media.m4a'), 'wb') as f:
+      f.write(os.urandom(args.size * 1024))
+    cookies = os.path.join(directory, 'cookies.txt')
+    write_cookies(cookies, args.cookies)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(Handler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    PROFILES['bench'] = {'cookiefile': cookies, 'format': 'a'}
+    opts = {'quiet': True, 'noprogress': True, **PROFILES['bench']}
+    downloaders = Downloaders(recycle_after=args.jobs + 1)
+    downloaders.warm('bench')
+
+    print(f'{args.jobs} jobs, {args.cookies} cookies, {args.size} KiB each')
+    measure('fresh', lambda outtmpl: fresh(opts, port, outtmpl), args.jobs, directory)
+    measure('reused', lambda outtmpl: reused(downloaders, port, outtmpl), args.jobs, directory)
+    downloaders.close()
+    server.shutdown()
+  finally:
+    shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == '__main__':
+  main()
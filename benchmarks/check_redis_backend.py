@@ -0,0 +1,181 @@
+# Checks of the Redis backend (STATE_BACKEND=redis) with two workers sharing one server, no Telegram involved
+# run: python benchmarks/check_redis_backend.py [--url redis://localhost:6379/15]
+# Without --url it runs against fakeredis (pip install fakeredis lupa), with it against a real server; keys get a
+# throwaway prefix and are deleted afterwards. Exits with 1 when a check fails.
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+from aiogram.dispatcher.event.bases import UNHANDLED
+from backends import RedisJobQueue, RedisStorage, RedisUpdateQueue, ShardRouter, connect_redis
+from downloads import LocalJobQueue, QueueFull
+from fake_api import message_update
+
+failures = []
+
+def check(name, ok, detail=''):
+  print(f'{"ok" if ok else "FAIL":<6}{name}{f" ({detail})" if detail and not ok else ""}')
+  if not ok:
+    failures.append(name)
+
+class FakeDispatcher:
+  # records what ShardRouter.consume() feeds
+  def __init__(self):
+    self.updates = []
+    self.fed = asyncio.Event()
+
+  async def feed_update(self, bot, update, **kwargs):
+    self.updates.append((update, kwargs))
+    self.fed.set()
+
+async def check_routing(clients, prefix):
+  # worker 0 gets an update of a chat worker 1 owns: it is passed on through Redis and fed on worker 1
+  routers = [ShardRouter(RedisUpdateQueue(client, prefix), worker_id, 2) for worker_id, client in enumerate(clients)]
+  handled = []
+  async def handler(event, data):
+    handled.append(event.update_id)
+
+  own, other = message_update('mine', chat_id=-100), message_update('theirs', chat_id=-101) # -100 % 2 == 0
+  await routers[0](handler, own, {})
+  result = await routers[0](handler, other, {})
+  check('own chat handled in place', handled == [own.update_id], handled)
+  check('other chat not handled', result is UNHANDLED and other.update_id not in handled)
+
+  dp = FakeDispatcher()
+  consumer = asyncio.create_task(routers[1].consume(dp, None))
+  try:
+    await asyncio.wait_for(dp.fed.wait(), 5)
+  except asyncio.TimeoutError:
+    pass
+  consumer.cancel()
+  await asyncio.gather(consumer, *routers[1].tasks, return_exceptions=True)
+  fed = [(update.update_id, update.message.text, kwargs.get('routed')) for update, kwargs in dp.updates]
+  check('owner gets the routed update', fed == [(other.update_id, 'theirs', True)], fed)
+  check('routed update marked for the owner', bool(dp.updates) and await routers[1](handler, dp.updates[0][0], {'routed': True}) is None)
+
+async def check_flush(clients, prefix):
+  # both workers count the same user, HINCRBY adds their batches up
+  storages = [RedisStorage(client, prefix=prefix) for client in clients]
+  for _ in range(3):
+    storages[0].count_message(-100, 7, 'old_name')
+  for _ in range(2):
+    storages[1].count_message(-100, 7, 'new_name')
+  storages[1].count_message(-100, 8, 'other')
+  storages[0].set_language(-100, 'ru')
+  storages[1].set_restriction(-100, 7, 'mute', 123, 'User')
+
+  await storages[0].flush()
+  await storages[1].flush()
+  rows = sorted(await storages[0].load_activity(-100))
+  check('counts of both workers summed', rows == [(7, 'new_name', 5), (8, 'other', 1)], rows)
+
+  storages[0].count_message(-100, 7, 'new_name')
+  await storages[0].flush()
+  rows = sorted(await storages[1].load_activity(-100))
+  check('second flush adds to the sum', rows[0] == (7, 'new_name', 6), rows)
+  check('languages shared', (await storages[1].load_languages()).get(-100) == 'ru')
+  check('restrictions shared', await storages[0].load_restrictions() == [(-100, 7, 'mute', 123, 'User')])
+
+  storages[0].delete_restriction(-100, 7, 'mute')
+  await storages[0].flush()
+  check('lifted restriction deleted', await storages[1].load_restrictions() == [])
+
+async def claimed(task, timeout=1.0):
+  # True when the acquire finished in time
+  await asyncio.wait((task,), timeout=timeout)
+  return task.done()
+
+async def check_claims(clients, prefix):
+  # one running job for the whole cluster, handed out by ticket order across workers
+  def queue(client, **kwargs):
+    options = dict(max_waiting=10, prefix=prefix, poll=0.05) | kwargs
+    return RedisJobQueue(client, LocalJobQueue(4, 4, 10), 1, **options)
+  a, b = queue(clients[0]), queue(clients[1])
+
+  job_a = await asyncio.wait_for(a.acquire(-100), 2)
+  first = asyncio.create_task(b.acquire(-101))
+  check('cluster limit holds the second job', not await claimed(first, 0.3))
+  second = asyncio.create_task(a.acquire(-102))
+  await asyncio.sleep(0.2)
+  check('waiting position counts both workers', await b.position(-103) == 3, await b.position(-103))
+
+  await a.release(-100, job_a)
+  check('oldest ticket goes first', await claimed(first) and not second.done())
+  await b.release(-101, first.result())
+  check('next one follows', await claimed(second))
+  await a.release(-102, second.result())
+
+  # queue limit of the cluster, not of one worker
+  small = queue(clients[1], max_waiting=1)
+  job_a = await a.acquire(-100)
+  waiting = asyncio.create_task(a.acquire(-101))
+  await asyncio.sleep(0.2)
+  try:
+    await small.acquire(-104)
+    full = False
+  except QueueFull:
+    full = True
+  check('cluster queue limit', full)
+  waiting.cancel()
+  await asyncio.gather(waiting, return_exceptions=True)
+  left = await clients[0].zcard(f'{prefix}:jobs:waiting')
+  check('cancelled job leaves the queue', left == 0, left)
+  await a.release(-100, job_a)
+
+  # a worker that died with a running job: its lease runs out
+  dead = queue(clients[0], lease=0.3)
+  await dead.acquire(-100)
+  started = time.monotonic()
+  after = asyncio.create_task(b.acquire(-101))
+  ok = await claimed(after, 2)
+  check('expired lease frees the slot', ok and time.monotonic() - started >= 0.2)
+  if ok:
+    await b.release(-101, after.result())
+
+  # a worker that died while waiting: its job is dropped after `timeout`, the ones behind it go on
+  silent = queue(clients[0], timeout=0.3)
+  job_a = await a.acquire(-100)
+  await clients[0].zadd(f'{prefix}:jobs:waiting', {'gone:0': 0}) # older than any ticket, nobody polls it
+  await clients[0].zadd(f'{prefix}:jobs:alive', {'gone:0': time.time()})
+  behind = asyncio.create_task(silent.acquire(-101))
+  await a.release(-100, job_a)
+  ok = await claimed(behind, 2)
+  check('silent waiting job dropped', ok)
+  if ok:
+    await silent.release(-101, behind.result())
+
+async def run(args):
+  prefix = f'check{os.getpid()}'
+  if args.url:
+    clients = [connect_redis(args.url), connect_redis(args.url)]
+  else:
+    import fakeredis
+    server = fakeredis.FakeServer() # one server, a client per worker
+    clients = [fakeredis.FakeAsyncRedis(server=server, decode_responses=True) for _ in range(2)]
+  try:
+    for name, func in (('routing', check_routing), ('flush', check_flush), ('claims', check_claims)):
+      print(f'-- {name}')
+      await func(clients, prefix)
+  finally:
+    keys = [key async for key in clients[0].scan_iter(f'{prefix}:*')]
+    if keys:
+      await clients[0].delete(*keys)
+    for client in clients:
+      await client.aclose()
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--url') # real server, fakeredis if not given
+  args = parser.parse_args()
+  asyncio.run(run(args))
+  if failures:
+    print(f'{len(failures)} failed')
+    sys.exit(1)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,89 @@
+# Fake Bot API and synthetic updates for the benchmarks, nothing leaves the process
+import asyncio
+import itertools
+import os
+import time
+
+from aiogram.client.session.base import BaseSession
+from aiogram.types import ChatMemberOwner, Message, Update, User
+
+ADMIN_ID = 1 # owner of every group chat
+ids = itertools.count(1000) # message and update IDs
+
+class FakeSession(BaseSession):
+  # answers every method like Telegram would, after `latency` seconds
+  def __init__(self, latency=0.0, admins=(ADMIN_ID,)):
+    super().__init__()
+    self.latency = latency
+    self.admins = admins # user IDs owning every chat
+    self.calls = {} # method -> count
+
+  async def close(self):
+    pass
+
+  async def stream_content(self, *args, **kwargs):
+    yield b''
+
+  async def make_request(self, bot, method, timeout=None):
+    name = type(method).__name__
+    self.calls[name] = self.calls.get(name, 0) + 1
+    if self.latency:
+      await asyncio.sleep(self.latency)
+
+    if name == 'GetChatAdministrators':
+      return [ChatMemberOwner(user=User(id=user_id, is_bot=False, first_name='Admin'), is_anonymous=False) for user_id in self.admins]
+    if name.startswith('Send'):
+      data = {
+        'message_id': next(ids),
+        'date': int(time.time()),
+        'chat': {'id': method.chat_id, 'type': 'supergroup'},
+        'text': getattr(method, 'text', None),
+      }
+      if name == 'SendAudio':
+        data['audio'] = {'file_id': f'audio{data["message_id"]}', 'file_unique_id': 'a', 'duration': 1}
+      elif name == 'SendVideo':
+        data['video'] = {'file_id': f'video{data["message_id"]}', 'file_unique_id': 'v', 'duration': 1, 'width': 1, 'height': 1}
+      return Message.model_validate(data, context={'bot': bot})
+    return True # edits, deletes, restrictions and callback answers
+
+def message_update(text, chat_id=-100, user_id=2, username=None, reply_to=None, chat_type='supergroup'):
+  # a text message, commands get their bot_command entity like real clients send
+  message = {
+    'message_id': next(ids),
+    'date': int(time.time()),
+    'chat': {'id': chat_id, 'type': chat_type},
+    'from': {'id': user_id, 'is_bot': False, 'first_name': 'User', 'username': username or f'user{user_id}'},
+    'text': text,
+  }
+  if text.startswith('/'):
+    message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+  if reply_to is not None:
+    message['reply_to_message'] = {
+      'message_id': next(ids),
+      'date': int(time.time()),
+      'chat': {'id': chat_id, 'type': chat_type},
+      'from': {'id': reply_to, 'is_bot': False, 'first_name': 'Target'},
+      'text': 'spam',
+    }
+  return Update.model_validate({'update_id': next(ids), 'message': message})
+
+# Stubbed media work, top-level functions so the process pool can run them like the real ones
+def fake_media(path):
+  delay = float(os.getenv('BENCH_DOWNLOAD_MS', 0)) / 1000 # download time
+  if delay:
+    time.sleep(delay)
+  with open(path, 'wb') as f:
+    f.write(b'\0' * int(os.getenv('BENCH_MEDIA_KB', 64)) * 1024)
+
+def fake_download_song(query, outtmpl, convert=True, job=None, probe=None):
+  filename = outtmpl.replace('%(ext)s', 'mp3' if convert else 'm4a')
+  fake_media(filename)
+  return {'filename': filename, 'extractor': 'Youtube', 'id': query}
+
+def fake_download_tiktok(url, filename, job=None, probe=None):
+  fake_media(filename)
+  return {'title': 'Video', 'uploader': 'author', 'extractor': 'TikTok', 'id': url.rsplit('/', 1)[-1]}
+
+def fake_probe_media(query, kind, max_bytes, max_duration, min_abr=0, prefer_ext=None, profile='probe'):
+  info = {'id': query, 'title': query, 'duration': 180, 'extractor': 'Youtube', 'extractor_key': 'Youtube'}
+  return {'info': info, 'format': 'a', 'size': 3 * 2 ** 20}
@@ -0,0 +1,2 @@
+from bot.config import Config
+from bot.app import App, create_app
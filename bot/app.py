@@ -0,0 +1,232 @@
+from aiogram import Bot, Dispatcher
+from importlib import import_module
+import asyncio
+import os
+import signal
+
+from activity import ActivityCounters
+from antiflood import FloodGuard
+from backends import connect_redis, RedisStorage, RedisJobQueue, RedisUpdateQueue, LocalUpdateQueue, ShardRouter
+from downloads import DownloadQueue, LocalJobQueue
+from i18n import translate
+from media_cache import MediaCache
+from metrics import Metrics, HandlerMetrics, ApiMetrics, MetricsServer
+from moderation import JoinLog
+from ordering import UpdateOrder, ReleaseUnordered
+from outbox import Outbox, PRIORITY_NAMES
+from permissions import PermissionCache
+from probe import Prober
+from restrictions import RestrictionRegistry
+from scratch import ScratchSpace
+from storage import Storage
+from tiktok import TikTokLinks
+from weather import WeatherClient
+from bot.config import Config
+from bot.routers.chatter import check_dropped
+from bot.routers.moderation import lift
+from bot.routers import ROUTERS
+
+class App:
+  # one bot: its Bot, Dispatcher and state; handlers get it as the `app` argument
+  def __init__(self, config, session=None):
+    self.config = config
+    self.bot = Bot(token=config.token, session=session)
+    self.outbox = Outbox(
+      config.api_global_rate, config.private_chat_rate, config.group_chat_rate / 60, config.moderation_chat_rate
+    ) # rate limits and priorities
+    self.bot.session.middleware(self.outbox) # every api call goes through it
+    self.metrics = Metrics() # handler, api and event loop timings
+    self.bot.session.middleware(ApiMetrics(self.metrics)) # inside the outbox, its wait is not counted
+    self.dp = Dispatcher(app=self) # handle commands
+    handler_metrics = HandlerMetrics(self.metrics)
+    release_unordered = ReleaseUnordered()
+    for name, observer in self.dp.observers.items():
+      if name not in ('update', 'error'):
+        observer.middleware(handler_metrics) # every handler of every event type, included routers too
+        observer.middleware(release_unordered) # long media handlers let their chat go on
+
+    if config.state_backend == 'redis':
+      # state, media slots and updates shared by all workers
+      self.redis_client = connect_redis(config.redis_url)
+      self.storage = RedisStorage(self.redis_client, config.flush_interval)
+      jobs = RedisJobQueue(
+        self.redis_client, LocalJobQueue(config.download_workers, config.download_per_chat, config.download_queue_size),
+        config.cluster_downloads, config.download_queue_size,
+      )
+      self.shard_router = ShardRouter(RedisUpdateQueue(self.redis_client), config.worker_id, config.workers, config.webhook_concurrency)
+    else:
+      self.redis_client = None
+      self.storage = Storage(config.db_path, config.flush_interval) # chats language and top users, write-behind
+      jobs = None # download slots of this process only
+      self.shard_router = ShardRouter(LocalUpdateQueue()) # one worker owns every chat
+    self.dp.update.outer_middleware(self.shard_router) # updates of chats owned by another worker go to it
+    self.update_order = UpdateOrder(
+      config.update_concurrency, config.chatter_wait, config.chatter_queue, lambda: self.metrics.loop_lag_last, config.shed_lag,
+      config.chat_queue, lambda update: check_dropped(self, update),
+    ) # one update of a chat at a time, capped in total; after the router, so only our chats are ordered
+    self.dp.update.outer_middleware(self.update_order)
+
+    self.activity = ActivityCounters(self.storage, config.activity_chats) # compact per-chat counters for /top
+    self.permissions = PermissionCache(config.admins_ttl) # chat admins for moderation commands
+    self.join_log = JoinLog() # recent joins for joined:<time>
+    self.restrictions = RestrictionRegistry(self.storage) # mutes and bans with their expiry, lifted on time
+    self.flood_guard = FloodGuard(
+      config.flood_messages, config.flood_window, config.duplicate_repeats, config.duplicate_chats, config.duplicate_window
+    ) # automatic mutes for floods and spam
+    self.download_queue = DownloadQueue(
+      config.download_workers, config.download_per_chat, config.download_queue_size, jobs, config.progress_interval,
+      config.download_recycle,
+    ) # media jobs off the event loop
+    self.prober = Prober(config.probe_cache_ttl) # metadata before downloads
+    self.tiktok_links = TikTokLinks(dedup_window=config.tiktok_dedup_window) # links in messages, short ones resolved once
+    self.scratch = ScratchSpace(
+      os.path.join(config.media_dir, str(config.worker_id)), config.media_quota_mb * 1024 * 1024,
+      2 * config.max_upload_mb * 1024 * 1024, # a job whose size the probe could not tell: the download and its converted copy
+    ) # per-job media files; sweep only sees this worker's own directory
+    self.media_cache = MediaCache(config.media_cache_db, config.media_cache_ttl * 3600, config.media_cache_size) # telegram file_id of sent media
+    self.weather = WeatherClient(
+      config.weather_api_key, config.weather_base_url, config.weather_timeout, config.weather_retries,
+      cache_ttl=config.weather_cache_ttl,
+    ) # pooled http session with answers cache
+    self.metrics_server = (
+      MetricsServer(self.metrics, config.metrics_host, config.metrics_port + config.worker_id) if config.metrics_port else None
+    ) # a port per worker
+    self.group_languages = {} # contains chats language data (loaded from storage on startup)
+    self.background = set() # tasks living as long as the bot
+    self.collect_metrics()
+
+    self.dp.startup.register(self.on_startup)
+    self.dp.shutdown.register(self.on_shutdown)
+
+  def collect_metrics(self):
+    # numbers of other parts, read on every scrape
+    metrics, download_queue, media_cache, weather, prober, outbox = (
+      self.metrics, self.download_queue, self.media_cache, self.weather, self.prober, self.outbox
+    )
+    metrics.collect('bot_download_queue_waiting', 'gauge', 'Media jobs waiting for a slot', download_queue.pending)
+    metrics.collect('bot_download_jobs', 'gauge', 'Media jobs in progress (waiting, downloading or uploading)', lambda: len(download_queue.active))
+    metrics.collect('bot_cache_hits_total', 'counter', 'Cache hits', lambda: [
+      ({'cache': 'media'}, media_cache.hits), ({'cache': 'weather'}, weather.hits + weather.coalesced), ({'cache': 'probe'}, prober.hits),
+    ])
+    metrics.collect('bot_cache_misses_total', 'counter', 'Cache misses', lambda: [
+      ({'cache': 'media'}, media_cache.misses), ({'cache': 'weather'}, weather.misses), ({'cache': 'probe'}, prober.misses),
+    ])
+    metrics.collect('bot_outbox_waiting', 'gauge', 'API calls waiting for their turn', lambda: [
+      ({'priority': priority}, waiting) for priority, waiting in outbox.depth().items()
+    ])
+    metrics.collect('bot_outbox_wait_seconds', 'histogram', 'Time API calls waited for their turn', lambda: [
+      ({'priority': PRIORITY_NAMES[priority]}, histogram) for priority, histogram in outbox.waits.items()
+    ])
+    metrics.collect('bot_outbox_sent_total', 'counter', 'API calls the outbox let through', lambda: outbox.sent)
+    metrics.collect('bot_outbox_retried_total', 'counter', 'API calls repeated after RetryAfter', lambda: outbox.retried)
+    metrics.collect('bot_updates_running', 'gauge', 'Updates being handled', lambda: self.update_order.running)
+    metrics.collect('bot_updates_waiting', 'gauge', 'Updates waiting for their turn', lambda: [
+      ({'for': 'chat'}, self.update_order.waiting_for_chat()), ({'for': 'slot'}, len(self.update_order.waiting)),
+    ])
+    metrics.collect('bot_updates_shed_total', 'counter', 'Plain messages dropped while the bot was overloaded', lambda: self.update_order.shed)
+    metrics.collect('bot_restrictions', 'gauge', 'Mutes and bans the bot is tracking', lambda: sum(
+      len(restrictions) for restrictions in self.restrictions.chats.values()
+    ))
+    metrics.collect('bot_flood_mutes_total', 'counter', 'Messages the flood guard flagged', lambda: self.flood_guard.triggered)
+    metrics.collect('bot_activity_chats', 'gauge', 'Chats with activity counters in memory', lambda: len(self.activity.chats))
+
+  def tr(self, chat_id, key):
+    # return value by chat language
+    return translate(self.group_languages.get(chat_id, 'en'), key) # defaults
+
+  def run_background(self, coro):
+    task = asyncio.create_task(coro)
+    self.background.add(task)
+    task.add_done_callback(self.background.discard)
+
+  async def on_startup(self):
+    self.group_languages.update(await self.storage.load_languages())
+    # restrictions of our chats, the ones that expired while the bot was down are lifted right away
+    self.restrictions.load(row for row in await self.storage.load_restrictions() if self.shard_router.owns(row[0]))
+    self.restrictions.start(lambda chat_id, user_id, kind: lift(self, chat_id, user_id, kind))
+    self.storage.start()
+    self.media_cache.start()
+    if self.shard_router.workers > 1:
+      self.background.add(asyncio.create_task(self.shard_router.consume(self.dp, self.bot)))
+    self.scratch.sweep() # orphaned files of the previous run
+    self.download_queue.start()
+    await self.weather.start()
+    await self.tiktok_links.start()
+    self.background.add(asyncio.create_task(self.metrics.watch_loop()))
+    if self.metrics_server:
+      await self.metrics_server.start()
+    # yt-dlp is imported on first use; load it in a thread now so the first probe does not wait for it
+    asyncio.get_running_loop().run_in_executor(None, import_module, 'yt_dlp')
+
+  async def on_shutdown(self):
+    for task in self.background:
+      task.cancel()
+    await self.restrictions.close()
+    self.download_queue.shutdown()
+    self.prober.close()
+    await self.media_cache.close()
+    await self.weather.close()
+    await self.tiktok_links.close()
+    if self.metrics_server:
+      await self.metrics_server.close()
+    await self.storage.close() # flush buffered counters
+    await self.outbox.close()
+    if self.redis_client:
+      await self.redis_client.aclose()
+
+  async def wait_for_stop(self):
+    # ctrl+c / SIGTERM
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+      loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+  async def run_worker(self):
+    # no updates of our own, only chats routed to this worker by the others
+    await self.dp.emit_startup(bot=self.bot)
+    await self.wait_for_stop()
+    await self.dp.emit_shutdown(bot=self.bot)
+    await self.bot.session.close()
+
+  async def run_webhook(self):
+    # updates are pushed to our http server
+    from aiohttp import web
+    from webhook import WebhookServer
+    config = self.config
+    server = WebhookServer(self.dp, self.bot, config.webhook_path, config.webhook_secret, config.webhook_concurrency)
+    runner = web.AppRunner(server.app())
+    await runner.setup()
+
+    await self.dp.emit_startup(bot=self.bot)
+    await web.TCPSite(runner, config.webhook_host, config.webhook_port).start()
+    if config.webhook_url:
+      await self.bot.set_webhook(
+        config.webhook_url.rstrip('/') + config.webhook_path,
+        secret_token=config.webhook_secret,
+        allowed_updates=self.dp.resolve_used_update_types(),
+      )
+
+    await self.wait_for_stop()
+
+    # graceful drain: refuse new updates, finish the running ones, then flush and close
+    await server.drain(config.drain_timeout)
+    await runner.cleanup()
+    await self.dp.emit_shutdown(bot=self.bot)
+    await self.bot.session.close()
+
+  async def run(self):
+    # get updates
+    if self.config.run_mode == 'webhook':
+      await self.run_webhook()
+    elif self.config.run_mode == 'worker':
+      await self.run_worker()
+    else:
+      await self.dp.start_polling(self.bot)
+
+def create_app(config=None, session=None):
+  # config: Config, from the environment if None; session: Bot API session, a fake one in tests and benchmarks
+  app = App(config or Config.from_env(), session)
+  for module in ROUTERS:
+    app.dp.include_router(module.create_router()) # new routers every time, a router has one parent
+  return app
@@ -0,0 +1,102 @@
+from dataclasses import dataclass, field, fields
+import os
+
+from weather import VISUAL_CROSSING_URL
+
+@dataclass
+class Config:
+  # every setting of the bot, Config.from_env() reads them from the environment (upper-case names)
+  token: str = field(default=None, repr=False, metadata={'env': 'API'}) # telegram token, env API
+  weather_api_key: str = field(default=None, repr=False) # weather token
+
+  # Run mode
+  run_mode: str = 'polling' # polling, webhook or worker (routed updates only)
+  webhook_url: str = None # public https base url, empty - don't register (local testing)
+  webhook_path: str = '/webhook'
+  webhook_secret: str = field(default=None, repr=False) # checked against X-Telegram-Bot-Api-Secret-Token
+  webhook_host: str = '0.0.0.0'
+  webhook_port: int = 8080
+  webhook_concurrency: int = 100 # updates processed at once
+  drain_timeout: float = 30 # seconds to finish running updates on shutdown
+
+  # Update processing (updates of one chat always run one after another)
+  update_concurrency: int = 100 # updates handled at once, 0 - no cap
+  chatter_wait: float = 5 # seconds a plain message waits for a free slot before it is dropped
+  chatter_queue: int = 1000 # plain messages waiting for a slot, more are dropped right away
+  chat_queue: int = 50 # updates of one chat waiting for their turn, plain messages past it are dropped
+  shed_lag: float = 1 # seconds of event loop lag above which plain messages are dropped when every slot is busy, 0 - off
+
+  # Scaling
+  state_backend: str = 'local' # local (SQLite, one bot process) or redis (shared by workers)
+  redis_url: str = 'redis://localhost:6379/0'
+  workers: int = 1 # bot processes sharing the chats (redis only)
+  worker_id: int = 0 # this process, 0..workers-1
+
+  # Storage
+  db_path: str = 'bot.db' # chat languages and activity
+  flush_interval: float = 5 # seconds between batched writes
+  activity_chats: int = 10000 # chats with counters kept in memory
+
+  # Metrics
+  metrics_host: str = '127.0.0.1' # /metrics for Prometheus, keep it private
+  metrics_port: int = 9108 # + worker_id, 0 - off
+  bot_admins: frozenset = frozenset() # user IDs that may use /botstats anywhere, comma separated
+
+  # Moderation
+  admins_ttl: int = 300 # seconds the admins list of a chat is trusted
+  flood_messages: int = 10 # messages of one user per flood_window before an automatic mute, 0 - off
+  flood_window: float = 10 # seconds
+  flood_mute: int = 600 # seconds of the automatic mute
+  duplicate_repeats: int = 3 # the same text from one user (any chats) per duplicate_window, 0 - off
+  duplicate_chats: int = 8 # chats the same text with a link may reach per duplicate_window before it counts as spam, 0 - off
+  duplicate_window: int = 300 # seconds
+
+  # Outbound bot api calls
+  api_global_rate: float = 30 # calls per second, all chats
+  private_chat_rate: float = 1 # messages per second in a private chat
+  group_chat_rate: float = 20 # messages per minute in a group
+  moderation_chat_rate: float = 5 # moderation calls per second in one chat
+
+  # Weather
+  weather_base_url: str = VISUAL_CROSSING_URL # local stub server for testing
+  weather_timeout: float = 10 # seconds
+  weather_retries: int = 3 # attempts
+  weather_cache_ttl: int = 600 # seconds, trade freshness for API quota
+
+  # Media downloads
+  download_workers: int = 2 # yt-dlp processes
+  download_per_chat: int = 1 # running jobs per chat
+  download_queue_size: int = 20 # waiting jobs limit, of the whole cluster with redis
+  progress_interval: int = 5 # seconds between progress edits in one chat
+  download_recycle: int = 50 # jobs before a worker replaces its YoutubeDL
+  cluster_downloads: int = None # jobs at once in all workers (redis), download_workers * workers by default
+  max_upload_mb: int = 50 # Telegram limit for files sent by bots
+  song_max_duration: int = 30 * 60 # seconds
+  video_max_duration: int = 10 * 60 # seconds
+  song_min_abr: int = 128 # kbit/s, the smallest audio format at least this good is taken
+  tiktok_dedup_window: int = 600 # seconds the same video posted again in a chat is skipped
+  probe_cache_ttl: int = 600 # seconds, format links expire after a few hours
+  song_pipeline: str = 'stream' # stream (m4a as is, other audio converted during the upload) or files (mp3 file first)
+  media_dir: str = 'media_tmp' # job directories, in a subdirectory per worker_id
+  media_quota_mb: int = 1024 # disk space for media jobs of one worker
+  media_cache_db: str = 'media_cache.db' # uploaded files
+  media_cache_ttl: int = 7 * 24 # hours
+  media_cache_size: int = 10000 # cached files
+
+  def __post_init__(self):
+    if self.cluster_downloads is None:
+      self.cluster_downloads = self.download_workers * self.workers
+
+  @classmethod
+  def from_env(cls, environ=os.environ):
+    # unset variables keep the defaults above
+    values = {}
+    for item in fields(cls):
+      value = environ.get(item.metadata.get('env', item.name.upper()))
+      if value is None:
+        continue
+      if item.type is frozenset:
+        values[item.name] = frozenset(int(part) for part in value.split(',') if part.strip())
+      else:
+        values[item.name] = item.type(value)
+    return cls(**values)
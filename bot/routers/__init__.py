@@ -0,0 +1,4 @@
+from bot.routers import general, moderation, media, weather, fun, stats, chatter
+
+# included in this order: commands first, chatter takes every other text message
+ROUTERS = (general, moderation, media, weather, fun, stats, chatter)
@@ -0,0 +1,40 @@
+from aiogram import F, Router
+from aiogram.types import Message
+
+from bot.routers.media import send_tiktok
+from bot.routers.moderation import auto_mute
+
+async def tiktok_handle_requests(message: Message, app, release_chat=None):
+  if message.chat.type != 'private':
+    # get IDs
+    chat_id = message.chat.id
+    user_id = message.from_user.id
+    username = message.from_user.username or message.from_user.full_name
+
+    reason = app.flood_guard.check(chat_id, user_id, message.text)
+    if reason:
+      await auto_mute(app, message, reason)
+
+    await app.activity.add(chat_id, user_id, username) # storage gets it on the next flush
+
+  if release_chat:
+    release_chat() # counted in order; the next messages of the chat don't wait for the downloads below
+
+  # every TikTok video of the message, unless the chat got it a moment ago
+  for url, video_id in await app.tiktok_links.new_videos(message.chat.id, message.text):
+    if not await send_tiktok(app, message, url):
+      app.tiktok_links.forget(message.chat.id, video_id)
+
+def check_dropped(app, update):
+  # plain messages dropped under load still go through the flood guard, a raid is what overloads us
+  message = update.message
+  if message is None or message.text is None or message.from_user is None or message.chat.type == 'private':
+    return
+  reason = app.flood_guard.check(message.chat.id, message.from_user.id, message.text)
+  if reason:
+    app.run_background(auto_mute(app, message, reason))
+
+def create_router():
+  router = Router(name='chatter')
+  router.message.register(tiktok_handle_requests, F.text) # handle each chat message
+  return router
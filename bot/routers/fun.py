@@ -0,0 +1,12 @@
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.types import Message
+import random
+
+async def cmd_r(message: Message, app):
+  await message.reply(random.choice(app.tr(message.chat.id, 'r')))
+
+def create_router():
+  router = Router(name='fun')
+  router.message.register(cmd_r, Command('r')) # random task
+  return router
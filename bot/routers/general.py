@@ -0,0 +1,33 @@
+from aiogram import Router
+from aiogram.filters import CommandStart, Command
+from aiogram.types import Message
+
+from i18n import LANGUAGES
+
+async def cmd_start(message: Message, app):
+  if message.chat.id not in app.group_languages:
+    await message.reply(app.tr(message.chat.id, 'choose_language'))
+  else:
+    await message.reply(app.tr(message.chat.id, 'greet'))
+  
+async def cmd_help(message: Message, app):
+  help_text = app.tr(message.chat.id, 'help')
+  await message.reply(help_text)
+
+async def set_language(message: Message, app):
+  args = message.text.replace('/setlang', '').strip().lower()
+  if args not in LANGUAGES:
+    # incorrect language
+    await message.reply(app.tr(message.chat.id, 'unknown_language'))
+    return
+  
+  app.group_languages[message.chat.id] = args # set chat language by chat id
+  app.storage.set_language(message.chat.id, args)
+  await message.reply(app.tr(message.chat.id, 'language_set'))
+
+def create_router():
+  router = Router(name='general')
+  router.message.register(set_language, Command('setlang')) # set language in specific chat
+  router.message.register(cmd_start, CommandStart()) # greetings and contact
+  router.message.register(cmd_help, Command('help')) # all commands
+  return router
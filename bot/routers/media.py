@@ -0,0 +1,249 @@
+from aiogram import F, Router
+from aiogram.exceptions import TelegramAPIError
+from aiogram.filters import Command
+from aiogram.types import Message, FSInputFile, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+import os
+
+from downloads import QueueFull, JobCancelled, download_song, download_tiktok
+from media_cache import media_key, query_key
+from media_stream import audio_file
+from probe import MediaRejected
+from scratch import QuotaExceeded
+from bot.utils import escape_markdown
+
+async def send_cached(app, message, key, send):
+  # reply with a file telegram already has, False if there is none
+  cached = await app.media_cache.get(key)
+  if not cached:
+    return False
+  
+  file_id, caption = cached
+  try:
+    if caption:
+      await send(file_id, caption=caption, parse_mode='MarkdownV2')
+    else:
+      await send(file_id)
+  except Exception as e:
+    print(f'Cached file error: {e}')
+    await app.media_cache.drop(key) # download it again
+    return False
+  return True
+
+async def cache_media(app, kind, info, file_id, alias, caption=None):
+  # remember the upload by video ID, the query or link points to it
+  if info.get('extractor') and info.get('id'):
+    await app.media_cache.put(media_key(kind, info['extractor'], info['id']), file_id, caption, [alias])
+  else:
+    await app.media_cache.put(alias, file_id, caption)
+
+async def loading_text(app, chat_id, key):
+  # loading message with the place in the download queue
+  text = app.tr(chat_id, key)
+  position = await app.download_queue.position(chat_id)
+  if position:
+    text += f'\n{app.tr(chat_id, 'queue_position')} {position}'
+  return text
+
+def cancel_markup(app, chat_id, job):
+  return InlineKeyboardMarkup(inline_keyboard=[[
+    InlineKeyboardButton(text=app.tr(chat_id, 'cancel_button'), callback_data=f'cancel:{job.id}')
+  ]])
+
+async def start_job(app, message, key):
+  # loading message with a cancel button, later edited to show the progress
+  job = app.download_queue.job(message.chat.id, message.from_user.id)
+  try:
+    loading_msg = await message.reply(await loading_text(app, message.chat.id, key), reply_markup=cancel_markup(app, message.chat.id, job))
+  except BaseException:
+    app.download_queue.finish(job)
+    raise
+  job.message_id = loading_msg.message_id
+  job.on_progress = lambda job: app.run_background(show_progress(app, loading_msg, key, job))
+  return job, loading_msg
+
+async def show_progress(app, loading_msg, key, job):
+  chat_id = loading_msg.chat.id
+  downloaded, total = job.progress
+  text = f'{app.tr(chat_id, key)}\n{app.tr(chat_id, 'download_progress')} {downloaded / 2 ** 20:.1f}'
+  if total:
+    text += f' / {total / 2 ** 20:.1f} MB ({downloaded / total:.0%})'
+  else:
+    text += ' MB'
+  try:
+    await loading_msg.edit_text(text, reply_markup=cancel_markup(app, chat_id, job))
+  except TelegramAPIError:
+    pass # the job ended and the message is gone
+
+async def can_cancel(app, bot, job, user_id):
+  # the author of the request or a chat admin
+  return job.user_id == user_id or await app.permissions.is_admin(bot, job.chat_id, user_id)
+
+async def cmd_cancel(message: Message, app):
+  jobs = app.download_queue.chat_jobs(message.chat.id)
+  if message.reply_to_message:
+    jobs = [job for job in jobs if job.message_id == message.reply_to_message.message_id]
+  else:
+    jobs = [job for job in jobs if job.user_id == message.from_user.id]
+  jobs = [job for job in jobs if await can_cancel(app, message.bot, job, message.from_user.id)]
+  
+  if not jobs:
+    await message.reply(app.tr(message.chat.id, 'nothing_to_cancel'))
+    return
+  for job in jobs:
+    app.download_queue.cancel(job) # the job's handler replies
+
+async def on_cancel_button(call: CallbackQuery, app):
+  job_id = call.data.removeprefix('cancel:')
+  job = app.download_queue.active.get(int(job_id)) if job_id.isdigit() else None
+  chat_id = call.message.chat.id if call.message else call.from_user.id
+  
+  if not job or job.chat_id != chat_id:
+    await call.answer(app.tr(chat_id, 'nothing_to_cancel'))
+  elif not await can_cancel(app, call.bot, job, call.from_user.id):
+    await call.answer(app.tr(chat_id, 'cancel_denied'), show_alert=True)
+  else:
+    app.download_queue.cancel(job)
+    await call.answer(app.tr(chat_id, 'job_cancelled'))
+
+def rejected_text(app, chat_id, reason, max_duration):
+  if reason == 'too_long':
+    return f'{app.tr(chat_id, 'media_too_long')} {max_duration // 60} {app.tr(chat_id, 'minutes')}'
+  return f'{app.tr(chat_id, 'media_too_large')} {app.config.max_upload_mb} MB'
+
+async def stream_song(app, message, query, outtmpl, job, probe):
+  async with app.download_queue.slot(message.chat.id): # FFmpeg of the upload is part of the job
+    result = await app.download_queue.call(download_song, query, outtmpl, False, job=job, probe=probe)
+    sent = await message.reply_audio(audio_file(result['filename']))
+  return result, sent
+
+async def send_song(app, message, query, outtmpl, job, probe):
+  # the upload runs inside the job as well, so the cancel button stays good until the file is posted
+  result = await app.download_queue.run(message.chat.id, download_song, query, outtmpl, job=job, probe=probe)
+  sent = await message.reply_audio(FSInputFile(result['filename']))
+  return result, sent
+
+async def cmd_song(message: Message, app):
+  config = app.config
+  query = message.text.replace('/song', '').strip()
+  
+  if not query:
+    # incorrect song
+    await message.reply(app.tr(message.chat.id, 'song_missing'))
+    return
+    
+  if not query.startswith('http'):
+    query = f'ytsearch:{query}'
+  
+  cache_key = query_key('audio', query)
+  if await send_cached(app, message, cache_key, message.reply_audio):
+    return
+    
+  job, loading_msg = await start_job(app, message, 'music_downloading')
+  
+  try:
+    # size and length are checked before anything is downloaded
+    probe = await job.wait(app.prober.probe(
+      query, 'audio', config.max_upload_mb * 2 ** 20, config.song_max_duration, config.song_min_abr,
+      'm4a' if config.song_pipeline == 'stream' else None
+    ))
+    with app.scratch.job(probe['size']) as job_dir: # removed with the audio after the upload
+      outtmpl = os.path.join(job_dir, 'song.%(ext)s')
+      if config.song_pipeline == 'stream':
+        result, sent = await job.wait(stream_song(app, message, query, outtmpl, job, probe))
+      else:
+        result, sent = await job.wait(send_song(app, message, query, outtmpl, job, probe))
+      await cache_media(app, 'audio', result, sent.audio.file_id, cache_key)
+    
+  except JobCancelled:
+    await message.reply(app.tr(message.chat.id, 'job_cancelled'))
+  except MediaRejected as e:
+    await message.reply(rejected_text(app, message.chat.id, e.args[0], config.song_max_duration))
+  except (QueueFull, QuotaExceeded):
+    await message.reply(app.tr(message.chat.id, 'queue_full'))
+  except Exception as e:
+    app.prober.forget(query, 'audio') # maybe an expired link
+    app.metrics.count_error('cmd_song', e)
+    print(f'Ошибка: {e}')
+  finally:
+    app.download_queue.finish(job)
+    
+  try:
+    await loading_msg.delete()
+  except:
+    pass
+
+async def tiktok_download(message: Message, app):
+  query = message.text.replace('/tiktok', '').strip()
+  
+  if not query:
+    await message.reply(app.tr(message.chat.id, 'tiktok_missing'))
+    return
+  
+  for link in app.tiktok_links.extract(query) or [query]:
+    url, _ = await app.tiktok_links.canonical(link)
+    await send_tiktok(app, message, url)
+
+async def upload_tiktok(app, message, query, filename, job, probe):
+  # download and upload as one job task, a cancel during the upload stops it too
+  info = await app.download_queue.run(message.chat.id, download_tiktok, query, filename, job=job, probe=probe)
+  
+  # video info
+  title = escape_markdown(info.get('title') or app.tr(message.chat.id, 'no_title'))
+  author = escape_markdown(info.get('uploader') or app.tr(message.chat.id, 'no_author'))
+  
+  caption_text = f'*{title}* — {author}\n\n[Schmidt Talk Bot](https://t.me/schmidt_talk_bot)'
+  
+  if not os.path.exists(filename):
+    return info, None, caption_text
+  sent = await message.reply_video(FSInputFile(filename), caption=caption_text, parse_mode='MarkdownV2')
+  return info, sent, caption_text
+
+async def send_tiktok(app, message, query):
+  # reply with the video, False if it could not be sent
+  config = app.config
+  cache_key = query_key('video', query)
+  if await send_cached(app, message, cache_key, message.reply_video):
+    return True
+  
+  sent = None
+  job, loading_msg = await start_job(app, message, 'video_downloading')
+
+  try:
+    probe = await job.wait(app.prober.probe(
+      query, 'video', config.max_upload_mb * 2 ** 20, config.video_max_duration, prefer_ext='mp4', profile='probe_tiktok'
+    ))
+    with app.scratch.job(probe['size']) as job_dir: # removed with the video after the upload
+      filename = os.path.join(job_dir, 'tiktok.mp4')
+      info, sent, caption_text = await job.wait(upload_tiktok(app, message, query, filename, job, probe))
+      if sent:
+        await cache_media(app, 'video', info, sent.video.file_id, cache_key, caption_text)
+    app.download_queue.finish(job) # nothing left to cancel
+    if not sent:
+      await message.reply(app.tr(message.chat.id, 'video_not_found'))
+
+  except JobCancelled:
+    await message.reply(app.tr(message.chat.id, 'job_cancelled'))
+  except MediaRejected as e:
+    await message.reply(rejected_text(app, message.chat.id, e.args[0], config.video_max_duration))
+  except (QueueFull, QuotaExceeded):
+    await message.reply(app.tr(message.chat.id, 'queue_full'))
+  except Exception as e:
+    app.prober.forget(query, 'video')
+    app.metrics.count_error('send_tiktok', e)
+    await message.reply(f'{app.tr(message.chat.id, 'video_error')} {e}')
+  finally:
+    app.download_queue.finish(job)
+
+  try:
+    await loading_msg.delete()
+  except:
+    pass
+  return sent is not None
+
+def create_router():
+  router = Router(name='media')
+  router.message.register(cmd_cancel, Command('cancel')) # stop own downloads, or the one whose loading message is replied to
+  router.callback_query.register(on_cancel_button, F.data.startswith('cancel:')) # cancel button under a loading message
+  router.message.register(cmd_song, Command('song'), flags={'unordered': True}) # send audio
+  router.message.register(tiktok_download, Command('tiktok'), flags={'unordered': True}) # download tiktok videos
+  return router
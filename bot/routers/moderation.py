@@ -0,0 +1,308 @@
+from aiogram import F, Router
+from aiogram.exceptions import TelegramAPIError
+from aiogram.filters import Command
+from aiogram.types import Message, ChatPermissions, ChatMemberUpdated
+import asyncio
+import datetime
+import time
+
+from bot.utils import parse_duration, parse_seconds, format_duration
+
+MUTED = ChatPermissions(
+  can_send_messages=False,
+  can_send_media_messages=False,
+  can_send_polls=False,
+  can_send_other_messages=False,
+  can_add_web_page_previews=False,
+  can_change_info=False,
+  can_invite_users=False,
+  can_pin_messages=False,
+)
+
+UNMUTED = ChatPermissions(
+  can_send_messages=True,
+  can_send_media_messages=True,
+  can_send_polls=True,
+  can_send_other_messages=True,
+  can_add_web_page_previews=True,
+  can_change_info=True,
+  can_invite_users=True,
+  can_pin_messages=True,
+)
+
+# User management commands
+async def mentioned_users(app, message):
+  # users picked in the command text: text mentions, @usernames seen in this chat, joined:<time>
+  chat_id = message.chat.id
+  user_ids = [entity.user.id for entity in message.entities or [] if entity.type == 'text_mention' and entity.user]
+  
+  for arg in message.text.split()[1:]:
+    if arg.startswith('@'):
+      user_id = await app.activity.find(chat_id, arg)
+      if user_id is not None:
+        user_ids.append(user_id)
+    elif arg.lower().startswith('joined:'):
+      since = parse_duration(arg[len('joined:'):])
+      if since:
+        seconds = (since - datetime.datetime.utcnow()).total_seconds()
+        user_ids.extend(app.join_log.since(chat_id, seconds))
+  
+  return user_ids
+
+def display_name(user):
+  return f'@{user.username}' if user.username else user.full_name
+
+async def target_names(app, message):
+  # names of the targets the message itself shows, for /mutelist without asking the API
+  names = {}
+  if message.reply_to_message:
+    user = message.reply_to_message.from_user
+    names[user.id] = display_name(user)
+  for entity in message.entities or []:
+    if entity.type == 'text_mention' and entity.user:
+      names[entity.user.id] = entity.user.full_name
+  for arg in message.text.split()[1:]:
+    if arg.startswith('@'):
+      user_id = await app.activity.find(message.chat.id, arg)
+      if user_id is not None:
+        names[user_id] = arg
+  return names
+
+def without_text_mentions(message):
+  # the command text with the names of text mentions cut out (entity offsets count UTF-16 code units)
+  text = message.text.encode('utf-16-le')
+  mentions = [entity for entity in message.entities or [] if entity.type == 'text_mention']
+  for entity in sorted(mentions, key=lambda entity: entity.offset, reverse=True):
+    text = text[:entity.offset * 2] + ' '.encode('utf-16-le') + text[(entity.offset + entity.length) * 2:]
+  return text.decode('utf-16-le')
+
+def command_duration(message):
+  # (seconds or None, False if an argument is neither a user nor a duration)
+  seconds = None
+  for arg in without_text_mentions(message).split()[1:]: # duration is the argument that is not a user
+    if not arg.startswith('@') and not arg.lower().startswith('joined:'):
+      seconds = parse_seconds(arg)
+      if not seconds:
+        return None, False
+  return seconds, True
+
+async def moderation_targets(app, message, reply_key, protect_admins=True):
+  # common checks of the moderation commands, returns user ids to act on (empty - already answered)
+  chat_id = message.chat.id
+  
+  # No permissions
+  if not await app.permissions.can_restrict(message.bot, chat_id, message.from_user.id):
+    await message.reply(app.tr(chat_id, 'no_permissions'))
+    return []
+  
+  user_ids = await mentioned_users(app, message)
+  if message.reply_to_message:
+    user_ids.insert(0, message.reply_to_message.from_user.id)
+  user_ids = list(dict.fromkeys(user_ids)) # everyone once
+  
+  if not user_ids:
+    # if haven't tagged the user
+    await message.reply(app.tr(chat_id, reply_key))
+    return []
+  
+  if protect_admins:
+    admins = await app.permissions.admins(message.bot, chat_id)
+    user_ids = [user_id for user_id in user_ids if user_id not in admins and user_id != message.bot.id]
+    if not user_ids:
+      await message.reply(app.tr(chat_id, 'no_permissions'))
+      return []
+  
+  return user_ids
+
+async def moderate(app, message, user_ids, action, success_key, failed_key):
+  # action(user_id) for everyone at once (outbox keeps the rate limits), one answer for all
+  chat_id = message.chat.id
+  results = await asyncio.gather(*(action(user_id) for user_id in user_ids), return_exceptions=True)
+  errors = [result for result in results if isinstance(result, Exception)]
+  
+  if len(user_ids) == 1:
+    if errors:
+      await message.reply(f'{app.tr(chat_id, failed_key)} {errors[0]}')
+    else:
+      await message.reply(app.tr(chat_id, success_key))
+    return
+  
+  text = f'{app.tr(chat_id, 'batch_done')} {len(user_ids) - len(errors)}/{len(user_ids)}'
+  if errors:
+    text += f'\n{app.tr(chat_id, failed_key)} {errors[0]}'
+  await message.reply(text)
+
+async def chat_member_changed(update: ChatMemberUpdated, app):
+  app.permissions.update(update.chat.id, update.new_chat_member)
+  old, new = update.old_chat_member.status, update.new_chat_member.status
+  if new == 'member' and old in ('left', 'kicked'):
+    app.join_log.add(update.chat.id, update.new_chat_member.user.id)
+  # lifted by hand in Telegram, /mutelist should not show it anymore
+  if old == 'restricted' and new != 'restricted':
+    app.restrictions.remove(update.chat.id, update.new_chat_member.user.id, 'mute')
+  if old == 'kicked' and new != 'kicked':
+    app.restrictions.remove(update.chat.id, update.new_chat_member.user.id, 'ban')
+
+async def members_joined(message: Message, app):
+  for user in message.new_chat_members:
+    app.join_log.add(message.chat.id, user.id)
+
+async def mute_user(message: Message, app):
+  # get IDs
+  chat_id = message.chat.id
+  user_ids = await moderation_targets(app, message, 'mute_reply_required')
+  if not user_ids:
+    return
+  
+  seconds, valid = command_duration(message)
+  if not valid:
+    # no silent permanent mute on a typo
+    await message.reply(app.tr(chat_id, 'bad_duration'))
+    return
+  until = time.time() + seconds if seconds else None
+  names = await target_names(app, message)
+  
+  async def mute(user_id):
+    await message.bot.restrict_chat_member(
+      chat_id=chat_id,
+      user_id=user_id,
+      permissions=MUTED,
+      until_date=int(until) if until else None
+    )
+    app.restrictions.add(chat_id, user_id, 'mute', until, names.get(user_id))
+  
+  await moderate(app, message, user_ids, mute, 'mute_success', 'mute_failed')
+
+async def unmute_user(message: Message, app):
+  # get IDs
+  chat_id = message.chat.id
+  user_ids = await moderation_targets(app, message, 'unmute_reply_required', protect_admins=False)
+  if not user_ids:
+    return
+  
+  async def unmute(user_id):
+    await message.bot.restrict_chat_member(
+        chat_id=chat_id,
+        user_id=user_id,
+        permissions=UNMUTED
+    )
+    app.restrictions.remove(chat_id, user_id, 'mute')
+  
+  await moderate(app, message, user_ids, unmute, 'unmute_success', 'unmute_failed')
+
+async def kick_user(message: Message, app):
+  # get IDs
+  chat_id = message.chat.id
+  user_ids = await moderation_targets(app, message, 'kick_reply_required')
+  if not user_ids:
+    return
+  
+  async def kick(user_id):
+    await message.bot.ban_chat_member(chat_id, user_id, until_date=0) # ban
+    await message.bot.unban_chat_member(chat_id, user_id) # unban
+    app.restrictions.remove(chat_id, user_id, 'ban')
+  
+  await moderate(app, message, user_ids, kick, 'kick_success', 'kick_failed')
+
+async def ban_user(message: Message, app):
+  # get IDs
+  chat_id = message.chat.id
+  user_ids = await moderation_targets(app, message, 'ban_reply_required')
+  if not user_ids:
+    return
+  
+  seconds, valid = command_duration(message)
+  if not valid:
+    await message.reply(app.tr(chat_id, 'bad_duration'))
+    return
+  until = time.time() + seconds if seconds else None
+  names = await target_names(app, message)
+  
+  async def ban(user_id):
+    await message.bot.ban_chat_member(chat_id, user_id, until_date=int(until) if until else None) # ban
+    app.restrictions.add(chat_id, user_id, 'ban', until, names.get(user_id))
+  
+  await moderate(app, message, user_ids, ban, 'ban_success', 'ban_failed')
+
+async def unban_user(message: Message, app):
+  # get IDs
+  chat_id = message.chat.id
+  user_ids = await moderation_targets(app, message, 'ban_reply_required', protect_admins=False)
+  if not user_ids:
+    return
+  
+  async def unban(user_id):
+    await message.bot.unban_chat_member(chat_id, user_id) # unban
+    app.restrictions.remove(chat_id, user_id, 'ban')
+  
+  await moderate(app, message, user_ids, unban, 'ban_success', 'ban_failed')
+
+async def cmd_mutelist(message: Message, app):
+  # who is muted or banned here and for how long, from the registry only
+  chat_id = message.chat.id
+  now = time.time()
+  rows = app.restrictions.active(chat_id, now)
+  if not rows:
+    await message.reply(app.tr(chat_id, 'mutelist_empty'))
+    return
+  
+  lines = []
+  for user_id, kind, until, name in rows[:50]:
+    left = f'{format_duration(until - now)} {app.tr(chat_id, 'mutelist_left')}' if until else app.tr(chat_id, 'mutelist_forever')
+    icon = '🔇' if kind == 'mute' else '⛔'
+    lines.append(f'{icon} {name or user_id} — {left}')
+  if len(rows) > 50:
+    lines.append(f'… +{len(rows) - 50}')
+  await message.reply(f'{app.tr(chat_id, 'mutelist_title')}\n\n' + '\n'.join(lines))
+
+async def flood_mute(app, chat_id, user_id, name=None):
+  # mute for FLOOD_MUTE seconds, admins are left alone; False if nobody was muted
+  try:
+    if await app.permissions.is_admin(app.bot, chat_id, user_id):
+      return False
+  except TelegramAPIError as e:
+    print(f'Flood mute error: {e}') # admins unknown, better not to mute one of them
+    return False
+  until = time.time() + app.config.flood_mute
+  try:
+    await app.bot.restrict_chat_member(chat_id=chat_id, user_id=user_id, permissions=MUTED, until_date=int(until))
+  except TelegramAPIError as e:
+    print(f'Flood mute error: {e}') # the bot has no rights here
+    return False
+  app.restrictions.add(chat_id, user_id, 'mute', until, name)
+  return True
+
+async def auto_mute(app, message, reason):
+  # the flood guard flagged the message: mute its author for a while
+  chat_id, user = message.chat.id, message.from_user
+  if reason == 'spread':
+    # the accounts that started the wave before it was recognized, in the chats they posted to
+    wave = app.flood_guard.wave(message.text)
+    await asyncio.gather(*(flood_mute(app, wave_chat, wave_user) for wave_chat, wave_user in wave))
+  if not await flood_mute(app, chat_id, user.id, display_name(user)):
+    return
+  why = app.tr(chat_id, f'flood_{reason}')
+  await message.reply(f'{app.tr(chat_id, 'flood_muted')} {format_duration(app.config.flood_mute)} ({why})')
+
+async def lift(app, chat_id, user_id, kind):
+  # the restriction expired: make sure Telegram lifted it too
+  try:
+    if kind == 'mute':
+      await app.bot.restrict_chat_member(chat_id=chat_id, user_id=user_id, permissions=UNMUTED)
+    else:
+      await app.bot.unban_chat_member(chat_id, user_id, only_if_banned=True)
+  except TelegramAPIError as e:
+    print(f'Lift {kind} error: {e}') # the user left, or the bot lost its rights
+
+def create_router():
+  router = Router(name='moderation')
+  router.chat_member.register(chat_member_changed) # admins list changes and joins
+  router.my_chat_member.register(chat_member_changed)
+  router.message.register(members_joined, F.new_chat_members) # joins for joined:<time>
+  router.message.register(mute_user, Command('mute')) # mute user for a certain time
+  router.message.register(unmute_user, Command('unmute')) # unmute user for a certain time
+  router.message.register(kick_user, Command('kick')) # kick user
+  router.message.register(ban_user, Command('ban')) # ban user
+  router.message.register(unban_user, Command('unban')) # unban user
+  router.message.register(cmd_mutelist, Command('mutelist')) # active mutes and bans of the chat
+  return router
@@ -0,0 +1,86 @@
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.types import Message
+
+from activity import WINDOWS
+
+async def cmd_cachestats(message: Message, app):
+  media = await app.media_cache.stats()
+  places = app.weather.stats()
+  await message.reply(
+    f'{app.tr(message.chat.id, 'cache_media')} {media['hits']}/{media['hits'] + media['misses']} '
+    f'({media['hit_rate']:.0%}), {app.tr(message.chat.id, 'cache_entries')} {media['entries']}\n'
+    f'{app.tr(message.chat.id, 'cache_weather')} {places['hits'] + places['coalesced']}/'
+    f'{places['hits'] + places['misses'] + places['coalesced']} '
+    f'({places['hit_rate']:.0%}), {app.tr(message.chat.id, 'cache_entries')} {places['entries']}'
+  )
+
+async def cmd_botstats(message: Message, app):
+  chat_id = message.chat.id
+  metrics, tr = app.metrics, app.tr
+  if message.from_user.id not in app.config.bot_admins and not await app.permissions.is_admin(message.bot, chat_id, message.from_user.id):
+    await message.reply(tr(chat_id, 'no_permissions'))
+    return
+  
+  lines = [tr(chat_id, 'botstats_title'), '']
+  slowest = metrics.slowest()
+  if slowest:
+    lines.append(tr(chat_id, 'botstats_handlers'))
+    lines += [f'  {name}: ≤ {p95:g} s ({calls})' for name, p95, calls in slowest]
+  lines.append(f'{tr(chat_id, 'botstats_errors')} {sum(metrics.errors.values())}')
+  lines.append(
+    f'{tr(chat_id, 'botstats_loop')} {metrics.loop_lag_last * 1000:.0f} ms '
+    f'(p95 ≤ {metrics.loop_lag.quantile(0.95) * 1000:g} ms)'
+  )
+  lines.append(f'{tr(chat_id, 'botstats_queue')} {app.download_queue.pending()} / {len(app.download_queue.active)}')
+  calls, p95, errors = metrics.api_summary()
+  lines.append(f'{tr(chat_id, 'botstats_api')} {calls}, p95 ≤ {p95:g} s, {tr(chat_id, 'botstats_api_errors')} {errors}')
+  media = await app.media_cache.stats()
+  places = app.weather.stats()
+  lines.append(f'{tr(chat_id, 'cache_media')} {media['hit_rate']:.0%}')
+  lines.append(f'{tr(chat_id, 'cache_weather')} {places['hit_rate']:.0%}')
+  await message.reply('\n'.join(lines))
+
+async def cmd_top(message: Message, app):
+  # /top [hour|day|week] [N]
+  limit, window = 10, None
+  for arg in message.text.split()[1:]:
+    if arg.isdigit() and int(arg) > 0:
+      limit = min(int(arg), 50)
+    elif arg.lower() in WINDOWS:
+      window = arg.lower()
+  
+  top = await app.activity.top(message.chat.id, limit, window)
+  if not top:
+    await message.reply(app.tr(message.chat.id, 'top_empty'))
+    return
+  
+  title = app.tr(message.chat.id, 'top_title')
+  if window:
+    window_name = app.tr(message.chat.id, f'window_{window}')
+    title += f' ({window_name})'
+  lines = [f'{place}. {username} — {messages}' for place, (_, username, messages) in enumerate(top, 1)]
+  await message.reply(f'{title}\n\n' + '\n'.join(lines))
+
+async def cmd_stats(message: Message, app):
+  args = message.text.replace('/stats', '').strip().lower()
+  window = args if args in WINDOWS else 'day'
+  
+  messages, users = await app.activity.stats(message.chat.id, window)
+  bucket_seconds, buckets = WINDOWS[window]
+  per_hour = messages / (bucket_seconds * buckets / 3600)
+  window_name = app.tr(message.chat.id, f'window_{window}')
+  await message.reply(
+    f'{app.tr(message.chat.id, 'stats_title')} {window_name}\n\n'
+    f'{app.tr(message.chat.id, 'stats_messages')} {messages}\n'
+    f'{app.tr(message.chat.id, 'stats_users')} {users}\n'
+    f'{app.tr(message.chat.id, 'stats_per_hour')} {per_hour:.1f}'
+  )
+
+def create_router():
+  router = Router(name='stats')
+  router.message.register(cmd_cachestats, Command('cachestats')) # cache efficiency
+  router.message.register(cmd_botstats, Command('botstats')) # quick health summary for bot and chat admins
+  router.message.register(cmd_top, Command('top')) # most active users of the chat
+  router.message.register(cmd_stats, Command('stats')) # chat activity for the last hour, day or week
+  return router
@@ -0,0 +1,35 @@
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.types import Message
+
+async def get_weather(message: Message, app):
+  location = message.text.replace('/weather', '').strip()
+  
+  if location == '':
+    await message.reply('')
+    return
+  
+  try:
+    data = await app.weather.get(location)
+    
+    if 'currentConditions' in data:
+      place = data['resolvedAddress']
+      current = data['currentConditions']
+      temp = current['temp']
+      conditions = current['conditions']
+      wind_speed = current['windspeed']
+      result = (
+        f'📍 {place}\n\n'
+        f'🌡 {app.tr(message.chat.id, 'temp')} {temp}°C\n'
+        f'☁️ {app.tr(message.chat.id, 'conditions')} {conditions}\n'
+        f'💨 {app.tr(message.chat.id, 'wind')} {wind_speed} km/h'
+      )
+      await message.reply(result)
+      
+  except Exception as e:
+    await message.reply(f'{app.tr(message.chat.id, 'weather_error')} {e}')
+
+def create_router():
+  router = Router(name='weather')
+  router.message.register(get_weather, Command('weather')) # current weather in region
+  return router
@@ -0,0 +1,38 @@
+import datetime
+import re
+
+def escape_markdown(text):
+  # markdown syntax for messages
+  return re.sub(r'([_*[\]()~`>#+\-=|{}.!])', r'\\\1', text)
+
+# Duration units, compound durations combine them: 1h30m, 2d12h
+UNITS = {'y': 365 * 24 * 3600, 'w': 7 * 24 * 3600, 'd': 24 * 3600, 'h': 3600, 'm': 60, 's': 1}
+DURATION = re.compile(r'(?:\d+[ywdhms])+')
+DURATION_PART = re.compile(r'(\d+)([ywdhms])')
+
+def parse_seconds(duration_str):
+  # '1h30m' -> 5400, None if it is not a duration
+  duration_str = duration_str.lower().strip()
+  if not DURATION.fullmatch(duration_str):
+    # incorrect number or unit
+    return None
+  return sum(int(value) * UNITS[unit] for value, unit in DURATION_PART.findall(duration_str))
+
+def parse_duration(duration_str):
+  #  set mute duration
+  seconds = parse_seconds(duration_str)
+  if seconds is None:
+    return None
+  return datetime.datetime.utcnow() + datetime.timedelta(seconds=seconds) # current time + duration
+
+def format_duration(seconds):
+  # 5400 -> '1h 30m', the two largest units
+  seconds = max(int(seconds), 1)
+  parts = []
+  for unit, size in UNITS.items():
+    if unit == 'w':
+      continue # 10d reads better than 1w 3d
+    if seconds >= size:
+      parts.append(f'{seconds // size}{unit}')
+      seconds %= size
+  return ' '.join(parts[:2])
@@ -0,0 +1,293 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from functools import partial
+from ytdl import downloaders
+import asyncio
+import itertools
+import multiprocessing
+import threading
+import time
+
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# Set in every pool process by DownloadQueue.start()
+_events = None # (job id, downloaded bytes, total bytes) for the bot process
+_cancelled = None # shared flags, job id % len -> 1 when the job should stop
+
+def _init_worker(events, cancelled, recycle_after):
+  global _events, _cancelled
+  _events, _cancelled = events, cancelled
+  downloaders.recycle_after = recycle_after
+  downloaders.warm('audio', 'audio_mp3', 'tiktok') # before the first job
+
+def progress_hook(job, interval=1):
+  # yt-dlp hook: reports progress at most every `interval` seconds and stops a cancelled job
+  last = [0]
+  def hook(d):
+    if _cancelled is not None and _cancelled[job % len(_cancelled)]:
+      from yt_dlp.utils import DownloadCancelled # loaded by the running job already
+      raise DownloadCancelled('cancelled by user')
+    now = time.monotonic()
+    if d['status'] == 'downloading' and _events is not None and now - last[0] >= interval:
+      last[0] = now
+      _events.put((job, d.get('downloaded_bytes') or 0, d.get('total_bytes') or d.get('total_bytes_estimate') or 0))
+  return hook
+
+def extract(ydl, query, probe):
+  # a probed info dict is downloaded as it is, without resolving the query again
+  if probe:
+    return ydl.process_ie_result(probe['info'], download=True)
+  info = ydl.extract_info(query, download=True)
+  if info.get('entries'):
+    info = info['entries'][0] # ytsearch: returns a playlist with one result
+  return info
+
+# Worker jobs (run inside the process pool, so they must stay picklable top-level functions)
+def download_song(query, outtmpl, convert=True, job=None, probe=None):
+  # download audio, returns the file path and the video ID
+  # convert=False keeps the source file (m4a preferred), the caller converts it while uploading if needed
+  # probe: result of probe.probe_media(), its format is used
+  hooks = [progress_hook(job)] if job is not None else []
+  with downloaders.use('audio_mp3' if convert else 'audio', outtmpl, probe and probe['format'], hooks) as ydl:
+    info = extract(ydl, query, probe)
+    if convert:
+      filename = outtmpl.replace('%(ext)s', 'mp3')
+    else:
+      downloaded = info.get('requested_downloads') or [{}]
+      filename = downloaded[0].get('filepath') or ydl.prepare_filename(info)
+
+  return {
+    'filename': filename,
+    'extractor': info.get('extractor_key') or info.get('extractor'),
+    'id': info.get('id'),
+  }
+
+def download_tiktok(url, filename, job=None, probe=None):
+  # download tiktok video, returns only the info we need (whole info dict is heavy to send back)
+  hooks = [progress_hook(job)] if job is not None else []
+  with downloaders.use('tiktok', filename, probe and probe['format'], hooks) as ydl:
+    info = extract(ydl, url.strip(), probe)
+
+  return {
+    'title': info.get('title'),
+    'uploader': info.get('uploader'),
+    'extractor': info.get('extractor_key') or info.get('extractor'),
+    'id': info.get('id'),
+  }
+
+class QueueFull(Exception):
+  # too many jobs are waiting already
+  pass
+
+class JobCancelled(Exception):
+  # stopped with /cancel or the cancel button
+  pass
+
+class Job:
+  # one media request of a user, followed by progress updates and cancellable at any point
+  def __init__(self, id, chat_id, user_id, message_id=None, on_progress=None):
+    self.id = id
+    self.chat_id = chat_id
+    self.user_id = user_id
+    self.message_id = message_id # loading message
+    self.on_progress = on_progress # on_progress(job), throttled per chat
+    self.progress = None # (downloaded bytes, total bytes)
+    self.cancelled = False
+    self.task = None
+
+  async def wait(self, coro):
+    # run coro as the job's task, JobCancelled if the user stopped it
+    self.task = asyncio.ensure_future(coro)
+    try:
+      return await self.task
+    except asyncio.CancelledError:
+      if self.cancelled and not asyncio.current_task().cancelling(): # not a shutdown
+        raise JobCancelled() from None
+      raise
+
+class LocalJobQueue:
+  # download slots of this process: global and per-chat limits, oldest job first
+  def __init__(self, workers=2, per_chat=1, max_waiting=20):
+    self.workers = workers # jobs running at once (all chats)
+    self.per_chat = per_chat # jobs running at once in one chat
+    self.max_waiting = max_waiting # queued jobs limit
+    self.running = 0
+    self.chat_running = {} # chat_id -> running jobs
+    self.waiting = [] # (chat_id, future) in order of arrival
+
+  def pending(self):
+    # jobs waiting for a free worker
+    return len(self.waiting)
+
+  async def position(self, chat_id):
+    # place a new job of this chat would get in the queue (0 - starts right away)
+    if self._can_start(chat_id):
+      return 0
+    return len(self.waiting) + 1
+
+  def _can_start(self, chat_id):
+    return self.running < self.workers and self.chat_running.get(chat_id, 0) < self.per_chat
+
+  def _acquire(self, chat_id):
+    self.running += 1
+    self.chat_running[chat_id] = self.chat_running.get(chat_id, 0) + 1
+
+  def _release(self, chat_id):
+    self.running -= 1
+    self.chat_running[chat_id] -= 1
+    if not self.chat_running[chat_id]:
+      del self.chat_running[chat_id]
+
+    # hand free slots to the oldest jobs that are allowed to start
+    for item in list(self.waiting):
+      waiting_chat, turn = item
+      if self._can_start(waiting_chat):
+        self.waiting.remove(item)
+        self._acquire(waiting_chat)
+        turn.set_result(None)
+
+  async def acquire(self, chat_id):
+    # wait for a slot, returns a job handle for release()
+    if self._can_start(chat_id):
+      self._acquire(chat_id)
+      return None
+
+    if len(self.waiting) >= self.max_waiting:
+      raise QueueFull()
+
+    item = (chat_id, asyncio.get_running_loop().create_future())
+    self.waiting.append(item)
+    try:
+      await item[1]
+    except asyncio.CancelledError:
+      if item in self.waiting:
+        self.waiting.remove(item)
+      elif item[1].done() and not item[1].cancelled():
+        self._release(chat_id) # slot was given right before the cancel
+      raise
+
+  async def release(self, chat_id, job):
+    self._release(chat_id)
+
+  def close(self):
+    for _, turn in self.waiting:
+      turn.cancel()
+    self.waiting.clear()
+
+class DownloadQueue:
+  # runs media jobs in a process pool, so the event loop stays free while yt-dlp and FFmpeg work
+  def __init__(self, workers=2, per_chat=1, max_waiting=20, jobs=None, progress_interval=5, recycle_after=50):
+    self.workers = workers # pool processes
+    self.recycle_after = recycle_after # jobs before a worker replaces its YoutubeDL
+    self.jobs = jobs or LocalJobQueue(workers, per_chat, max_waiting) # who may start, can be shared between bots
+    self.progress_interval = progress_interval # seconds between progress callbacks in one chat
+    self.executor = None
+    self.events = None
+    self.flags = None
+    self.ids = itertools.count(1)
+    self.active = {} # job id -> Job
+    self.last_progress = {} # chat_id -> time of the last progress callback
+
+  def start(self):
+    # workers come from a clean server process, not forked from the bot: a lock some thread (probes, the event reader,
+    # an import) holds at fork time would stay held forever in the child
+    context = multiprocessing.get_context(START_METHOD)
+    self.events = context.Queue()
+    self.flags = context.Array('b', 4096, lock=False) # more than jobs that can be running or queued
+    self.executor = ProcessPoolExecutor(
+      max_workers=self.workers, mp_context=context, initializer=_init_worker,
+      initargs=(self.events, self.flags, self.recycle_after),
+    )
+    loop = asyncio.get_running_loop()
+    threading.Thread(target=self._read_events, args=(loop, self.events), daemon=True).start()
+
+  def _stop_pool(self):
+    if self.executor:
+      self.executor.shutdown(wait=False, cancel_futures=True)
+      self.executor = None
+    if self.events:
+      self.events.put(None) # stops the reader thread
+      self.events = None
+
+  def shutdown(self):
+    self.jobs.close()
+    self._stop_pool()
+
+  def restart(self, broken):
+    # a pool process died (OOM killer, FFmpeg crash): the executor refuses every job after that, replace it
+    if self.executor is not broken:
+      return # another job of the same pool got here first
+    print('Download pool broken, restarting it')
+    self._stop_pool()
+    self.start()
+
+  def _read_events(self, loop, events):
+    # blocking queue reads stay off the event loop
+    while (event := events.get()) is not None:
+      loop.call_soon_threadsafe(self._progress, *event)
+
+  def _progress(self, job_id, downloaded, total):
+    job = self.active.get(job_id)
+    if not job or job.cancelled:
+      return
+    job.progress = (downloaded, total)
+    now = time.monotonic()
+    if job.on_progress and now - self.last_progress.get(job.chat_id, 0) >= self.progress_interval:
+      self.last_progress[job.chat_id] = now
+      job.on_progress(job)
+
+  def job(self, chat_id, user_id, message_id=None, on_progress=None):
+    # register a job, finish(job) when it is over
+    job = Job(next(self.ids), chat_id, user_id, message_id, on_progress)
+    if self.flags is not None:
+      self.flags[job.id % len(self.flags)] = 0
+    self.active[job.id] = job
+    return job
+
+  def finish(self, job):
+    self.active.pop(job.id, None)
+    if not any(other.chat_id == job.chat_id for other in self.active.values()):
+      self.last_progress.pop(job.chat_id, None)
+
+  def cancel(self, job):
+    # the pool process stops on its next progress hook, the slot is freed right away
+    job.cancelled = True
+    if self.flags is not None:
+      self.flags[job.id % len(self.flags)] = 1
+    if job.task:
+      job.task.cancel()
+
+  def chat_jobs(self, chat_id):
+    return [job for job in self.active.values() if job.chat_id == chat_id]
+
+  def pending(self):
+    return self.jobs.pending()
+
+  async def position(self, chat_id):
+    return await self.jobs.position(chat_id)
+
+  @asynccontextmanager
+  async def slot(self, chat_id):
+    # one job of the chat, for work that goes on outside the pool (streamed uploads)
+    job = await self.jobs.acquire(chat_id)
+    try:
+      yield
+    finally:
+      await self.jobs.release(chat_id, job)
+
+  async def call(self, func, *args, job=None, **kwargs):
+    # run func(*args, **kwargs) in the pool, the caller holds a slot
+    if job is not None:
+      kwargs['job'] = job.id # progress and cancel flag of the job
+    executor = self.executor
+    try:
+      return await asyncio.get_running_loop().run_in_executor(executor, partial(func, *args, **kwargs))
+    except BrokenProcessPool:
+      self.restart(executor) # this job fails, the next ones get a new pool
+      raise
+
+  async def run(self, chat_id, func, *args, job=None, **kwargs):
+    # wait for a slot, then run func(*args, **kwargs) in the pool
+    async with self.slot(chat_id):
+      return await self.call(func, *args, job=job, **kwargs)
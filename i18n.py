@@ -0,0 +1,28 @@
+import json
+import os
+
+LOCALES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'locales')
+DEFAULT_LANGUAGE = 'en'
+
+def load_translations(path=LOCALES_DIR):
+  # one <lang>.json per language, flattened to {(key, lang): text}
+  table = {}
+  for name in sorted(os.listdir(path)):
+    lang, ext = os.path.splitext(name)
+    if ext != '.json':
+      continue
+    with open(os.path.join(path, name), encoding='utf-8') as f:
+      for key, value in json.load(f).items():
+        table[(key, lang)] = value
+  return table
+
+# Built once at import, tr() only does a dict lookup
+TRANSLATIONS = load_translations()
+LANGUAGES = sorted({lang for _, lang in TRANSLATIONS})
+
+def translate(lang, key):
+  # missing text falls back to english, then to the key itself
+  text = TRANSLATIONS.get((key, lang))
+  if text is None:
+    text = TRANSLATIONS.get((key, DEFAULT_LANGUAGE), key)
+  return text
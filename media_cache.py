@@ -0,0 +1,156 @@
+import asyncio
+import re
+import sqlite3
+import threading
+import time
+
+# Links we can turn into a video ID without asking the site
+YOUTUBE_ID = re.compile(r'(?:youtube\.com/(?:watch\?(?:\S*&)?v=|shorts/|embed/|live/)|youtu\.be/)([\w-]{11})')
+TIKTOK_ID = re.compile(r'tiktok\.com/(?:@[\w.-]+/video|v)/(\d+)')
+
+def media_key(kind, extractor, video_id):
+  # kind - 'audio' or 'video', the same ID can be sent both ways
+  return f'{kind}:{extractor.lower()}:{video_id}'
+
+def query_key(kind, query):
+  # stable key for a search query or link
+  query = query.strip()
+  match = YOUTUBE_ID.search(query)
+  if match:
+    return media_key(kind, 'youtube', match.group(1))
+  match = TIKTOK_ID.search(query)
+  if match:
+    return media_key(kind, 'tiktok', match.group(1))
+  if query.startswith('ytsearch:'):
+    return f'{kind}:ytsearch:' + ' '.join(query[len('ytsearch:'):].lower().split())
+  return f'{kind}:url:{query}'
+
+class MediaCache:
+  # maps videos to telegram file_id of the first upload, so repeats are sent without downloading
+  # SQLite work runs in a worker thread; hits only touch memory, their `used` times are written with the next eviction
+  def __init__(self, path='media_cache.db', ttl=7 * 24 * 3600, max_entries=10000, evict_interval=60):
+    self.ttl = ttl # seconds
+    self.max_entries = max_entries # may be passed by the puts of one `evict_interval`
+    self.evict_interval = evict_interval # seconds between evictions
+    self.used = {} # key -> time of its last hit, not written yet
+    self.hits = 0
+    self.misses = 0
+    self.task = None
+
+    self.lock = threading.Lock() # one worker thread at a time on the connection
+    self.db = sqlite3.connect(path, check_same_thread=False)
+    self.db.executescript('''
+      CREATE TABLE IF NOT EXISTS media (
+        key TEXT PRIMARY KEY,
+        file_id TEXT NOT NULL,
+        caption TEXT,
+        created REAL NOT NULL,
+        used REAL NOT NULL
+      );
+      CREATE INDEX IF NOT EXISTS media_used ON media (used);
+      CREATE TABLE IF NOT EXISTS aliases (
+        alias TEXT PRIMARY KEY,
+        key TEXT NOT NULL
+      );
+    ''')
+
+  def _get(self, key):
+    with self.lock:
+      row = self.db.execute('SELECT key FROM aliases WHERE alias = ?', (key,)).fetchone()
+      if row:
+        key = row[0]
+      return key, self.db.execute('SELECT file_id, caption, created FROM media WHERE key = ?', (key,)).fetchone()
+
+  async def get(self, key):
+    # (file_id, caption) or None, key can be an alias (query, short link)
+    key, row = await asyncio.to_thread(self._get, key)
+    now = time.time()
+    if not row or row[2] < now - self.ttl:
+      self.misses += 1
+      return None
+
+    self.hits += 1
+    self.used[key] = now
+    return row[0], row[1]
+
+  def _put(self, key, file_id, caption, aliases, now):
+    with self.lock, self.db:
+      self.db.execute(
+        'INSERT OR REPLACE INTO media (key, file_id, caption, created, used) VALUES (?, ?, ?, ?, ?)',
+        (key, file_id, caption, now, now)
+      )
+      self.db.executemany(
+        'INSERT OR REPLACE INTO aliases (alias, key) VALUES (?, ?)',
+        [(alias, key) for alias in aliases if alias != key]
+      )
+
+  async def put(self, key, file_id, caption=None, aliases=()):
+    self.used.pop(key, None)
+    await asyncio.to_thread(self._put, key, file_id, caption, aliases, time.time())
+
+  def _drop(self, key):
+    with self.lock, self.db:
+      self.db.execute('DELETE FROM media WHERE key IN (SELECT key FROM aliases WHERE alias = ?) OR key = ?', (key, key))
+
+  async def drop(self, key):
+    # file_id stopped working
+    await asyncio.to_thread(self._drop, key)
+
+  def _evict(self, used, now):
+    with self.lock, self.db:
+      self.db.executemany('UPDATE media SET used = ? WHERE key = ?', [(when, key) for key, when in used.items()])
+      self.db.execute('DELETE FROM media WHERE created < ?', (now - self.ttl,))
+      self.db.execute(
+        'DELETE FROM media WHERE key NOT IN (SELECT key FROM media ORDER BY used DESC LIMIT ?)',
+        (self.max_entries,)
+      )
+      self.db.execute('DELETE FROM aliases WHERE key NOT IN (SELECT key FROM media)')
+
+  async def evict(self):
+    # write the hits since the last time, then drop expired entries and least recently used ones above the size limit
+    used, self.used = self.used, {}
+    try:
+      await asyncio.to_thread(self._evict, used, time.time())
+    except Exception:
+      for key, when in used.items():
+        self.used.setdefault(key, when) # next time
+      raise
+
+  async def run(self):
+    while True:
+      await asyncio.sleep(self.evict_interval)
+      try:
+        await self.evict()
+      except Exception as e:
+        print(f'Media cache eviction error: {e}')
+
+  def start(self):
+    self.task = asyncio.create_task(self.run())
+
+  def _count(self):
+    with self.lock:
+      return self.db.execute('SELECT COUNT(*) FROM media').fetchone()[0]
+
+  async def stats(self):
+    total = self.hits + self.misses
+    return {
+      'hits': self.hits,
+      'misses': self.misses,
+      'hit_rate': self.hits / total if total else 0.0,
+      'entries': await asyncio.to_thread(self._count),
+    }
+
+  async def close(self):
+    if self.task:
+      self.task.cancel()
+      try:
+        await self.task
+      except asyncio.CancelledError:
+        pass
+      self.task = None
+    try:
+      await self.evict() # keep the last hits
+    except Exception as e:
+      print(f'Media cache eviction error: {e}')
+    with self.lock:
+      self.db.close()
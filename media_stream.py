@@ -0,0 +1,36 @@
+from aiogram.types import FSInputFile, InputFile
+import asyncio
+import os
+
+PASSTHROUGH = ('.m4a', '.mp3') # formats Telegram plays as audio, uploaded as they are
+
+class TranscodedAudio(InputFile):
+  # mp3 made by FFmpeg on the fly, its stdout goes straight into the upload request body
+  def __init__(self, path, filename='song.mp3', bitrate='192k', chunk_size=64 * 1024):
+    super().__init__(filename, chunk_size)
+    self.path = path
+    self.bitrate = bitrate
+
+  async def read(self, bot):
+    # a new FFmpeg for every read, so a retried request sends the whole file again
+    process = await asyncio.create_subprocess_exec(
+      'ffmpeg', '-nostdin', '-loglevel', 'error', '-i', self.path,
+      '-vn', '-codec:a', 'libmp3lame', '-b:a', self.bitrate, '-f', 'mp3', 'pipe:1',
+      stdout=asyncio.subprocess.PIPE,
+    )
+    try:
+      while chunk := await process.stdout.read(self.chunk_size):
+        yield chunk
+      if await process.wait():
+        raise RuntimeError(f'ffmpeg exited with {process.returncode}') # fail the upload, not a cut song
+    finally:
+      if process.returncode is None:
+        process.kill() # upload aborted
+        await process.wait()
+
+def audio_file(path):
+  # upload as is when Telegram accepts the format, otherwise convert while uploading
+  name, ext = os.path.splitext(os.path.basename(path))
+  if ext.lower() in PASSTHROUGH:
+    return FSInputFile(path)
+  return TranscodedAudio(path, f'{name}.mp3')
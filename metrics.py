@@ -0,0 +1,207 @@
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+import asyncio
+import bisect
+import time
+
+# Upper bounds in seconds, the last bucket is +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+class Histogram:
+  __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+  def __init__(self, buckets=LATENCY_BUCKETS):
+    self.buckets = buckets
+    self.counts = [0] * (len(buckets) + 1)
+    self.sum = 0.0
+    self.count = 0
+
+  def observe(self, value):
+    self.counts[bisect.bisect_left(self.buckets, value)] += 1
+    self.sum += value
+    self.count += 1
+
+  def quantile(self, q):
+    # upper bound of the bucket holding the q-th value, good enough for a summary
+    if not self.count:
+      return 0.0
+    rank = q * self.count
+    seen = 0
+    for bound, count in zip(self.buckets, self.counts):
+      seen += count
+      if seen >= rank:
+        return bound
+    return float('inf')
+
+  def lines(self, name, labels):
+    # labels: 'key="value",...' or ''
+    seen = 0
+    for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+      seen += count
+      yield f'{name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {seen}'
+    labels = f'{{{labels}}}' if labels else ''
+    yield f'{name}_sum{labels} {self.sum}'
+    yield f'{name}_count{labels} {self.count}'
+
+def label(value):
+  return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Metrics:
+  # in-process numbers for the /metrics endpoint and /botstats
+  def __init__(self):
+    self.started = time.time()
+    self.handlers = {} # handler -> Histogram
+    self.errors = {} # (handler, error type) -> count
+    self.api = {} # method -> Histogram
+    self.api_errors = {} # (method, error type) -> count
+    self.loop_lag = Histogram(LAG_BUCKETS)
+    self.loop_lag_last = 0.0
+    self.collectors = [] # (name, kind, help, func), func() -> value or [(labels, value)]
+
+  def observe_handler(self, name, seconds):
+    histogram = self.handlers.get(name)
+    if histogram is None:
+      histogram = self.handlers[name] = Histogram()
+    histogram.observe(seconds)
+
+  def count_error(self, name, error):
+    key = (name, type(error).__name__)
+    self.errors[key] = self.errors.get(key, 0) + 1
+
+  def observe_api(self, method, seconds, error=None):
+    histogram = self.api.get(method)
+    if histogram is None:
+      histogram = self.api[method] = Histogram()
+    histogram.observe(seconds)
+    if error is not None:
+      key = (method, type(error).__name__)
+      self.api_errors[key] = self.api_errors.get(key, 0) + 1
+
+  def collect(self, name, kind, help, func):
+    # numbers owned by other parts of the bot, read on every scrape; kind - gauge, counter or histogram (values are Histograms)
+    self.collectors.append((name, kind, help, func))
+
+  async def watch_loop(self, interval=0.5):
+    # how late a sleep wakes up = how long something blocked the event loop
+    loop = asyncio.get_running_loop()
+    while True:
+      start = loop.time()
+      await asyncio.sleep(interval)
+      self.loop_lag_last = max(loop.time() - start - interval, 0.0)
+      self.loop_lag.observe(self.loop_lag_last)
+
+  def render(self):
+    # Prometheus text format
+    lines = [
+      '# HELP bot_handler_seconds Time spent in update handlers',
+      '# TYPE bot_handler_seconds histogram',
+    ]
+    for name, histogram in sorted(self.handlers.items()):
+      lines.extend(histogram.lines('bot_handler_seconds', f'handler="{label(name)}"'))
+    lines += ['# HELP bot_handler_errors_total Exceptions in update handlers', '# TYPE bot_handler_errors_total counter']
+    for (name, error), count in sorted(self.errors.items()):
+      lines.append(f'bot_handler_errors_total{{handler="{label(name)}",error="{label(error)}"}} {count}')
+
+    lines += ['# HELP bot_api_seconds Bot API call time, without the outbox wait', '# TYPE bot_api_seconds histogram']
+    for method, histogram in sorted(self.api.items()):
+      lines.extend(histogram.lines('bot_api_seconds', f'method="{label(method)}"'))
+    lines += ['# HELP bot_api_errors_total Failed Bot API calls', '# TYPE bot_api_errors_total counter']
+    for (method, error), count in sorted(self.api_errors.items()):
+      lines.append(f'bot_api_errors_total{{method="{label(method)}",error="{label(error)}"}} {count}')
+
+    lines += ['# HELP bot_loop_lag_seconds Event loop lag', '# TYPE bot_loop_lag_seconds histogram']
+    lines.extend(self.loop_lag.lines('bot_loop_lag_seconds', ''))
+    lines += ['# HELP bot_uptime_seconds Seconds since start', '# TYPE bot_uptime_seconds gauge']
+    lines.append(f'bot_uptime_seconds {time.time() - self.started:.0f}')
+
+    for name, kind, help, func in self.collectors:
+      lines += [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+      try:
+        value = func()
+      except Exception as e:
+        print(f'Metrics error ({name}): {e}')
+        continue
+      if isinstance(value, list):
+        for labels, number in value:
+          labels = ','.join(f'{key}="{label(text)}"' for key, text in labels.items())
+          if kind == 'histogram':
+            lines.extend(number.lines(name, labels))
+          else:
+            lines.append(f'{name}{{{labels}}} {number}')
+      elif kind == 'histogram':
+        lines.extend(value.lines(name, ''))
+      else:
+        lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+  def slowest(self, limit=5):
+    # [(handler, p95 seconds, calls)], slowest first
+    rows = [(name, histogram.quantile(0.95), histogram.count) for name, histogram in self.handlers.items()]
+    return sorted(rows, key=lambda row: -row[1])[:limit]
+
+  def api_summary(self):
+    # (calls, p95 seconds over all methods, errors)
+    merged = Histogram()
+    for histogram in self.api.values():
+      merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+      merged.count += histogram.count
+    return merged.count, merged.quantile(0.95), sum(self.api_errors.values())
+
+class HandlerMetrics(BaseMiddleware):
+  # inner middleware: latency and exceptions of every handler
+  def __init__(self, metrics):
+    self.metrics = metrics
+
+  async def __call__(self, handler, event, data):
+    handler_object = data.get('handler')
+    name = handler_object.callback.__name__ if handler_object else 'unknown'
+    start = time.perf_counter()
+    try:
+      return await handler(event, data)
+    except Exception as e:
+      self.metrics.count_error(name, e)
+      raise
+    finally:
+      self.metrics.observe_handler(name, time.perf_counter() - start)
+
+class ApiMetrics(BaseRequestMiddleware):
+  # session middleware after the outbox: time of the call itself
+  def __init__(self, metrics):
+    self.metrics = metrics
+
+  async def __call__(self, make_request, bot, method):
+    start = time.perf_counter()
+    error = None
+    try:
+      return await make_request(bot, method)
+    except Exception as e:
+      error = e
+      raise
+    finally:
+      self.metrics.observe_api(type(method).__name__, time.perf_counter() - start, error)
+
+class MetricsServer:
+  # GET /metrics for Prometheus, keep it on a local interface
+  def __init__(self, metrics, host='127.0.0.1', port=9108):
+    self.metrics = metrics
+    self.host = host
+    self.port = port
+    self.runner = None
+
+  async def handle(self, request):
+    from aiohttp import web
+    return web.Response(text=self.metrics.render(), content_type='text/plain', charset='utf-8')
+
+  async def start(self):
+    from aiohttp import web # server side of aiohttp, only loaded when metrics are on
+    app = web.Application()
+    app.router.add_get('/metrics', self.handle)
+    self.runner = web.AppRunner(app, access_log=None)
+    await self.runner.setup()
+    await web.TCPSite(self.runner, self.host, self.port).start()
+
+  async def close(self):
+    if self.runner:
+      await self.runner.cleanup()
+      self.runner = None
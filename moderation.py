@@ -0,0 +1,30 @@
+from collections import deque
+import time
+
+class JoinLog:
+  # who joined each chat recently, for /ban joined:10m after a raid
+  def __init__(self, per_chat=1000, max_age=24 * 3600):
+    self.per_chat = per_chat # joins kept per chat
+    self.max_age = max_age # seconds
+    self.chats = {} # chat_id -> deque of (time, user_id)
+
+  def add(self, chat_id, user_id, now=None):
+    joins = self.chats.get(chat_id)
+    if joins is None:
+      joins = self.chats[chat_id] = deque(maxlen=self.per_chat)
+    joins.append((time.time() if now is None else now, user_id))
+
+  def since(self, chat_id, seconds, now=None):
+    # user ids that joined in the last `seconds`, oldest first
+    now = time.time() if now is None else now
+    joins = self.chats.get(chat_id)
+    if not joins:
+      return []
+
+    while joins and joins[0][0] < now - self.max_age:
+      joins.popleft()
+    if not joins:
+      del self.chats[chat_id]
+      return []
+
+    return list(dict.fromkeys(user_id for joined, user_id in joins if joined >= now - seconds))
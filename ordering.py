@@ -0,0 +1,158 @@
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.dispatcher.flags import get_flag
+from backends import update_chat_id
+from collections import deque
+import asyncio
+import heapq
+
+# Priorities, lower goes first
+COMMAND = 0
+CHATTER = 1
+
+def update_priority(update):
+  # plain messages are chatter; commands, buttons and member updates are what someone waits for
+  message = update.message or update.edited_message
+  if message is not None and not (message.text or message.caption or '').startswith('/'):
+    return CHATTER
+  return COMMAND
+
+class UpdateOrder(BaseMiddleware):
+  # outer update middleware: updates of one chat run one after another in the order they came, other chats in parallel
+  # at most `limit` updates run at once; when all of them are busy commands get the next free slot first,
+  # chatter waits at most `chatter_wait` seconds and is dropped when the queue or the event loop lag says we are behind
+  # an update waiting behind its own chat calls data['on_hold'], so the webhook or the router can take another chat meanwhile
+  def __init__(self, limit=100, chatter_wait=5, chatter_queue=1000, lag=None, max_lag=0, chat_queue=50, on_shed=None):
+    self.limit = limit # 0 - no cap
+    self.chatter_wait = chatter_wait
+    self.chatter_queue = chatter_queue # chatter waiting for a slot, more is dropped right away
+    self.lag = lag # -> seconds the event loop is behind, checked with max_lag (0 - off)
+    self.max_lag = max_lag
+    self.chat_queue = chat_queue # updates of one chat waiting for their turn, chatter past it is dropped, 0 - no cap
+    self.on_shed = on_shed # on_shed(update) for every dropped update
+    self.chats = {} # chat_id -> deque of futures of updates waiting for their turn, present while one runs
+    self.running = 0
+    self.waiting = [] # (priority, seq, future) for a slot, cancelled futures are skipped when popped
+    self.waiting_chatter = 0
+    self.seq = 0
+
+    # metrics
+    self.shed = 0
+    self.chat_waits = 0 # updates that waited for an earlier one of their chat
+
+  def waiting_for_chat(self):
+    return sum(map(len, self.chats.values()))
+
+  async def __call__(self, handler, event, data):
+    chat_id = update_chat_id(event)
+    priority = update_priority(event)
+    if not await self._chat_turn(chat_id, priority, data.get('on_hold')):
+      return self._drop(event)
+    try:
+      allowed = await self._slot(priority)
+    except BaseException:
+      self._next_in_chat(chat_id)
+      raise
+    if not allowed:
+      self._next_in_chat(chat_id)
+      return self._drop(event)
+
+    released = False
+    def release():
+      # the next update of the chat may start; long handlers call it (or get the `unordered` flag) when the rest can wait
+      nonlocal released
+      if not released:
+        released = True
+        self._release_slot()
+        self._next_in_chat(chat_id)
+
+    data['release_chat'] = release
+    try:
+      return await handler(event, data)
+    finally:
+      release()
+
+  def _drop(self, event):
+    self.shed += 1
+    if self.on_shed:
+      self.on_shed(event)
+    return UNHANDLED
+
+  async def _chat_turn(self, chat_id, priority, on_hold=None):
+    # True once it is the update's turn in its chat, False when chatter finds the chat queue full
+    waiters = self.chats.get(chat_id)
+    if waiters is None:
+      self.chats[chat_id] = deque() # nobody runs, ours
+      return True
+    full = self.chat_queue and len(waiters) >= self.chat_queue
+    if full and priority == CHATTER:
+      return False
+    if on_hold and not full:
+      on_hold() # the caller's slot counts running updates, not ones queued behind their chat; past the cap commands keep it
+
+    future = asyncio.get_running_loop().create_future()
+    waiters.append(future)
+    self.chat_waits += 1
+    try:
+      await future
+    except asyncio.CancelledError:
+      if future.cancelled():
+        waiters.remove(future)
+      else:
+        self._next_in_chat(chat_id) # the turn came together with the cancellation
+      raise
+    return True
+
+  def _next_in_chat(self, chat_id):
+    waiters = self.chats[chat_id]
+    while waiters:
+      future = waiters.popleft()
+      if not future.done():
+        future.set_result(None)
+        return
+    del self.chats[chat_id]
+
+  async def _slot(self, priority):
+    # True once the update may run, False when it is dropped
+    if not self.limit or self.running < self.limit:
+      self.running += 1
+      return True
+    if priority == CHATTER and (
+      self.waiting_chatter >= self.chatter_queue or self.max_lag and self.lag and self.lag() > self.max_lag
+    ):
+      return False
+
+    future = asyncio.get_running_loop().create_future()
+    self.seq += 1
+    heapq.heappush(self.waiting, (priority, self.seq, future))
+    if priority == CHATTER:
+      self.waiting_chatter += 1
+    try:
+      await asyncio.wait((future,), timeout=self.chatter_wait if priority == CHATTER else None)
+    except asyncio.CancelledError:
+      if not future.cancel():
+        self._release_slot() # it was ours already
+      raise
+    finally:
+      if priority == CHATTER:
+        self.waiting_chatter -= 1
+    if future.cancel(): # no slot in time
+      return False
+    return True
+
+  def _release_slot(self):
+    # the slot goes straight to the first waiting update, so `running` only drops when nobody waits
+    while self.waiting:
+      _, _, future = heapq.heappop(self.waiting)
+      if not future.done():
+        future.set_result(None)
+        return
+    self.running -= 1
+
+class ReleaseUnordered(BaseMiddleware):
+  # inner middleware: handlers registered with flags={'unordered': True} (long media jobs) don't hold up their chat
+  async def __call__(self, handler, event, data):
+    release = data.get('release_chat')
+    if release and get_flag(data, 'unordered'):
+      release()
+    return await handler(event, data)
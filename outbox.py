@@ -0,0 +1,167 @@
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from metrics import Histogram
+from ratelimit import TokenBucket
+import asyncio
+import heapq
+import time
+
+# Priorities, lower goes first
+MODERATION = 0
+CHATTER = 1
+MEDIA = 2
+PRIORITY_NAMES = {MODERATION: 'moderation', CHATTER: 'chatter', MEDIA: 'media'}
+
+MODERATION_METHODS = {
+  'BanChatMember', 'UnbanChatMember', 'RestrictChatMember', 'PromoteChatMember',
+  'DeleteMessage', 'DeleteMessages', 'GetChatAdministrators', 'GetChatMember',
+}
+MEDIA_METHODS = {
+  'SendAudio', 'SendVideo', 'SendDocument', 'SendPhoto', 'SendAnimation', 'SendVoice', 'SendVideoNote', 'SendMediaGroup',
+}
+
+class Outbox(BaseRequestMiddleware):
+  # every chat-bound bot api call waits here for its turn: moderation first, then replies, then media
+  def __init__(self, global_rate=30, private_rate=1, group_rate=20 / 60, moderation_rate=5, retries=3):
+    self.global_bucket = TokenBucket(global_rate, global_rate)
+    self.rates = {
+      'private': (private_rate, 3),
+      'group': (group_rate, 20),
+      'moderation': (moderation_rate, moderation_rate),
+    } # bucket kind -> (calls per second, burst)
+    self.retries = retries # attempts after RetryAfter
+    self.buckets = {} # (chat_id, kind) -> TokenBucket
+    self.queues = {} # bucket key -> heap of (priority, seq, future, enqueued), cancelled futures are skipped when popped
+    self.ready = [] # (priority, seq, token, bucket key) of buckets with a token now, ordered by their first call
+    self.timers = [] # (time their token is due, token, bucket key) of the other buckets with calls
+    self.scheduled = {} # bucket key -> token of its live ready or timers entry, older entries are skipped
+    self.seq = 0
+    self.wakeup = asyncio.Event()
+    self.task = None
+
+    # metrics
+    self.sent = 0
+    self.retried = 0
+    self.waits = {priority: Histogram() for priority in PRIORITY_NAMES} # priority -> seconds from the call to its turn
+
+  def classify(self, method, chat_id):
+    # (priority, bucket kind)
+    name = type(method).__name__
+    if name in MODERATION_METHODS:
+      return MODERATION, 'moderation'
+    kind = 'private' if isinstance(chat_id, int) and chat_id > 0 else 'group'
+    return (MEDIA if name in MEDIA_METHODS else CHATTER), kind
+
+  def bucket(self, key):
+    bucket = self.buckets.get(key)
+    if bucket is None:
+      if len(self.buckets) > 10000:
+        # buckets that are full again carry no state
+        now = time.monotonic()
+        self.buckets = {k: value for k, value in self.buckets.items() if not value.full(now)}
+      bucket = self.buckets[key] = TokenBucket(*self.rates[key[1]])
+    return bucket
+
+  async def __call__(self, make_request, bot, method):
+    chat_id = getattr(method, 'chat_id', None)
+    if chat_id is None:
+      return await make_request(bot, method) # getUpdates, getMe... are not limited
+
+    priority, kind = self.classify(method, chat_id)
+    key = (chat_id, kind)
+    for attempt in range(self.retries + 1):
+      await self.acquire(key, priority)
+      try:
+        return await make_request(bot, method)
+      except TelegramRetryAfter as e:
+        if attempt == self.retries:
+          raise
+        self.retried += 1
+        self.bucket(key).pause(e.retry_after, time.monotonic())
+
+  async def acquire(self, key, priority):
+    if self.task is None:
+      self.task = asyncio.create_task(self.run())
+
+    future = asyncio.get_running_loop().create_future()
+    self.seq += 1
+    queue = self.queues.setdefault(key, [])
+    heapq.heappush(queue, (priority, self.seq, future, time.monotonic()))
+    if key not in self.scheduled or queue[0][2] is future:
+      self._schedule(key, time.monotonic()) # new bucket, or our call goes before the ones it was scheduled for
+      self.wakeup.set()
+    await future
+
+  def _schedule(self, key, now):
+    # put the bucket where its first live call belongs: ready, or a timer for its next token
+    queue = self.queues[key]
+    while queue and queue[0][2].done():
+      heapq.heappop(queue) # cancelled
+    if not queue:
+      del self.queues[key]
+      self.scheduled.pop(key, None)
+      return
+    self.seq += 1
+    token = self.scheduled[key] = self.seq
+    wait = self.bucket(key).wait(now)
+    if wait <= 0:
+      heapq.heappush(self.ready, (queue[0][0], queue[0][1], token, key))
+    else:
+      heapq.heappush(self.timers, (now + wait, token, key))
+
+  async def run(self):
+    # hands out tokens: the most urgent call whose chat is not limited right now, O(log n) per call
+    while True:
+      now = time.monotonic()
+      while self.timers and self.timers[0][0] <= now:
+        _, token, key = heapq.heappop(self.timers)
+        if self.scheduled.get(key) == token:
+          self._schedule(key, now)
+
+      if not self.ready:
+        self.wakeup.clear()
+        timeout = self.timers[0][0] - now if self.timers else None
+        try:
+          await asyncio.wait_for(self.wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+          pass
+        continue
+
+      wait = self.global_bucket.wait(now)
+      if wait > 0:
+        await asyncio.sleep(wait)
+        continue
+
+      _, _, token, key = heapq.heappop(self.ready)
+      if self.scheduled.get(key) != token:
+        continue # rescheduled since
+      queue = self.queues[key]
+      while queue and queue[0][2].done():
+        heapq.heappop(queue) # cancelled
+      if queue and self.bucket(key).wait(now) <= 0: # a RetryAfter pause could have emptied it
+        priority, _, future, enqueued = heapq.heappop(queue)
+        self.global_bucket.take()
+        self.bucket(key).take()
+        future.set_result(None)
+        self.sent += 1
+        self.waits[priority].observe(now - enqueued)
+      self._schedule(key, now)
+      await asyncio.sleep(0) # let the callers run between dispatches
+
+  def depth(self):
+    # priority name -> calls waiting for their turn
+    depth = dict.fromkeys(PRIORITY_NAMES.values(), 0)
+    for queue in self.queues.values():
+      for priority, _, future, _ in queue:
+        if not future.done():
+          depth[PRIORITY_NAMES[priority]] += 1
+    return depth
+
+  async def close(self):
+    if self.task:
+      self.task.cancel()
+      try:
+        await self.task
+      except asyncio.CancelledError:
+        pass
+      self.task = None
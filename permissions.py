@@ -0,0 +1,53 @@
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramNotFound
+import asyncio
+import time
+
+class PermissionCache:
+  # chat admins from one get_chat_administrators call, kept fresh by chat_member updates
+  def __init__(self, ttl=300):
+    self.ttl = ttl # seconds, in case we miss an update
+    self.chats = {} # chat_id -> (expires, {user_id: ChatMember})
+    self.inflight = {} # chat_id -> running get_chat_administrators
+
+  async def admins(self, bot, chat_id):
+    entry = self.chats.get(chat_id)
+    if entry and entry[0] > time.monotonic():
+      return entry[1]
+
+    task = self.inflight.get(chat_id)
+    if not task:
+      task = asyncio.ensure_future(self._load(bot, chat_id))
+      self.inflight[chat_id] = task
+      task.add_done_callback(lambda _: self.inflight.pop(chat_id, None))
+    return await asyncio.shield(task)
+
+  async def _load(self, bot, chat_id):
+    try:
+      members = await bot.get_chat_administrators(chat_id)
+    except (TelegramBadRequest, TelegramForbiddenError, TelegramNotFound):
+      members = [] # private chat or the bot was removed; network errors and RetryAfter are raised, not cached
+    admins = {member.user.id: member for member in members}
+    self.chats[chat_id] = (time.monotonic() + self.ttl, admins)
+    return admins
+
+  def update(self, chat_id, member):
+    # someone got or lost admin rights
+    entry = self.chats.get(chat_id)
+    if not entry:
+      return # not cached yet, the next lookup loads it
+    if member.status in ('creator', 'administrator'):
+      entry[1][member.user.id] = member
+    else:
+      entry[1].pop(member.user.id, None)
+
+  def forget(self, chat_id):
+    self.chats.pop(chat_id, None)
+
+  async def is_admin(self, bot, chat_id, user_id):
+    return user_id in await self.admins(bot, chat_id)
+
+  async def can_restrict(self, bot, chat_id, user_id):
+    member = (await self.admins(bot, chat_id)).get(user_id)
+    if member is None:
+      return False
+    return member.status == 'creator' or getattr(member, 'can_restrict_members', False)
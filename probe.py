@@ -0,0 +1,109 @@
+from concurrent.futures import ThreadPoolExecutor
+from ytdl import downloaders
+import asyncio
+import time
+
+class MediaRejected(Exception):
+  # the probe found the media over a limit, args[0] is 'too_long' or 'too_large'
+  pass
+
+# Fields the download needs again, the rest (thumbnails, subtitles, other formats) is dropped from the cache
+KEEP_FIELDS = (
+  'id', 'title', 'uploader', 'duration', 'extractor', 'extractor_key', 'webpage_url', 'original_url',
+  'webpage_url_basename', 'webpage_url_domain', 'display_id', 'ext', 'http_headers', '_type',
+)
+
+def estimate_size(fmt, duration):
+  # bytes, None if the extractor gives no hint
+  size = fmt.get('filesize') or fmt.get('filesize_approx')
+  if not size and fmt.get('tbr') and duration:
+    size = int(fmt['tbr'] * 1000 / 8 * duration)
+  return size
+
+def pick_format(info, kind, max_bytes, min_abr=0, prefer_ext=None):
+  # smallest format under the size cap: audio only for 'audio' (at least min_abr kbit/s when there is one),
+  # video with sound for 'video'; formats of prefer_ext go first, unknown sizes last
+  duration = info.get('duration')
+  candidates = []
+  for fmt in info.get('formats') or [info]:
+    if kind == 'audio' and (fmt.get('acodec') == 'none' or fmt.get('vcodec') not in (None, 'none')):
+      continue
+    if kind == 'video' and (fmt.get('vcodec') == 'none' or fmt.get('acodec') == 'none'):
+      continue
+    size = estimate_size(fmt, duration)
+    if size and size > max_bytes:
+      continue
+    candidates.append((fmt, size))
+
+  good = [item for item in candidates if (item[0].get('abr') or 0) >= min_abr]
+  candidates = good or candidates
+  if not candidates:
+    return None, None
+  return min(candidates, key=lambda item: (prefer_ext is not None and item[0].get('ext') != prefer_ext, item[1] is None, item[1] or 0))
+
+def probe_media(query, kind, max_bytes, max_duration, min_abr=0, prefer_ext=None, profile='probe'):
+  # metadata only, returns {'info': slim info dict, 'format': format_id, 'size': estimated bytes}
+  with downloaders.use(profile) as ydl:
+    info = ydl.extract_info(query, download=False)
+    if info.get('entries'):
+      info = info['entries'][0] # ytsearch: returns a playlist with one result
+    info = ydl.sanitize_info(info)
+
+  if info.get('is_live') or (max_duration and (info.get('duration') or 0) > max_duration):
+    raise MediaRejected('too_long')
+  fmt, size = pick_format(info, kind, max_bytes, min_abr, prefer_ext)
+  if fmt is None:
+    raise MediaRejected('too_large')
+
+  slim = {field: info[field] for field in KEEP_FIELDS if field in info}
+  slim['formats'] = [fmt]
+  return {'info': slim, 'format': fmt.get('format_id') or 'best', 'size': size}
+
+class Prober:
+  # cached probes, run in threads (mostly waiting for the site), the download reuses the result
+  def __init__(self, ttl=600, max_entries=256, concurrency=4):
+    self.ttl = ttl # seconds, format URLs expire after a few hours
+    self.max_entries = max_entries
+    self.cache = {} # (kind, query) -> (expires, probe or MediaRejected)
+    self.inflight = {} # (kind, query) -> running probe
+    self.executor = ThreadPoolExecutor(concurrency, thread_name_prefix='probe') # few threads, each keeps its YoutubeDL
+    self.hits = 0
+    self.misses = 0
+
+  def close(self):
+    self.executor.shutdown(wait=False, cancel_futures=True)
+
+  async def probe(self, query, kind, max_bytes, max_duration, min_abr=0, prefer_ext=None, profile='probe'):
+    key = (kind, query)
+    entry = self.cache.get(key)
+    if entry and entry[0] > time.monotonic():
+      self.hits += 1
+      result = entry[1]
+    else:
+      task = self.inflight.get(key)
+      if not task:
+        self.misses += 1
+        task = asyncio.ensure_future(self._probe(key, query, kind, max_bytes, max_duration, min_abr, prefer_ext, profile))
+        self.inflight[key] = task
+        task.add_done_callback(lambda _: self.inflight.pop(key, None))
+      result = await asyncio.shield(task)
+
+    if isinstance(result, MediaRejected):
+      raise MediaRejected(*result.args)
+    return result
+
+  async def _probe(self, key, *args):
+    try:
+      result = await asyncio.get_running_loop().run_in_executor(self.executor, probe_media, *args)
+    except MediaRejected as e:
+      result = e # rejections are cached too, asking again for a 10-hour stream stays cheap
+
+    self.cache.pop(key, None)
+    self.cache[key] = (time.monotonic() + self.ttl, result)
+    while len(self.cache) > self.max_entries:
+      del self.cache[next(iter(self.cache))]
+    return result
+
+  def forget(self, query, kind):
+    # the download failed, the next request probes again
+    self.cache.pop((kind, query), None)
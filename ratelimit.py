@@ -0,0 +1,28 @@
+import time
+
+class TokenBucket:
+  # `rate` calls per second on average, bursts up to `capacity`
+  __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+  def __init__(self, rate, capacity):
+    self.rate = rate
+    self.capacity = capacity
+    self.tokens = capacity
+    self.updated = time.monotonic()
+
+  def wait(self, now):
+    # seconds until a token is available (0 - right now)
+    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+    self.updated = now
+    return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+  def take(self):
+    self.tokens -= 1
+
+  def pause(self, seconds, now):
+    # telegram asked us to wait (RetryAfter)
+    self.wait(now)
+    self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+  def full(self, now):
+    return self.wait(now) == 0 and self.tokens >= self.capacity
@@ -0,0 +1,97 @@
+import asyncio
+import heapq
+import time
+
+class RestrictionRegistry:
+  # active mutes and bans of every chat; a heap of expiry times wakes the bot up to lift them
+  # Telegram lifts most of them by itself, but not the ones it treats as forever (under 30 s or over 366 days),
+  # and the registry is what /mutelist shows without asking the API
+  def __init__(self, storage=None):
+    self.storage = storage # write-behind persistence, None - memory only
+    self.chats = {} # chat_id -> {(user_id, kind): (until or None for permanent, name)}
+    self.heap = [] # (until, chat_id, user_id, kind), replaced and removed entries are skipped when popped
+    self.wakeup = None
+    self.task = None
+    self.lifting = set() # running on_expire calls
+
+  def load(self, rows):
+    # (chat_id, user_id, kind, until, name) rows from storage, expired ones are lifted as soon as run() starts
+    for chat_id, user_id, kind, until, name in rows:
+      self.chats.setdefault(chat_id, {})[(user_id, kind)] = (until, name)
+      if until is not None:
+        self.heap.append((until, chat_id, user_id, kind))
+    heapq.heapify(self.heap)
+
+  def add(self, chat_id, user_id, kind, until=None, name=None):
+    # kind: mute or ban; until: unix time, None - until someone lifts it
+    self.chats.setdefault(chat_id, {})[(user_id, kind)] = (until, name)
+    if until is not None:
+      heapq.heappush(self.heap, (until, chat_id, user_id, kind))
+      if self.heap[0][0] == until and self.wakeup:
+        self.wakeup.set() # earlier than what the scheduler sleeps for
+      self._compact()
+    if self.storage:
+      self.storage.set_restriction(chat_id, user_id, kind, until, name)
+
+  def remove(self, chat_id, user_id, kind):
+    restrictions = self.chats.get(chat_id)
+    if not restrictions or restrictions.pop((user_id, kind), None) is None:
+      return False
+    if not restrictions:
+      del self.chats[chat_id]
+    if self.storage:
+      self.storage.delete_restriction(chat_id, user_id, kind)
+    return True
+
+  def active(self, chat_id, now=None):
+    # [(user_id, kind, until, name)] of one chat, soonest to expire first, permanent ones last
+    now = time.time() if now is None else now
+    rows = [
+      (user_id, kind, until, name)
+      for (user_id, kind), (until, name) in self.chats.get(chat_id, {}).items()
+      if until is None or until > now
+    ]
+    return sorted(rows, key=lambda row: (row[2] is None, row[2] or 0))
+
+  def _compact(self):
+    # re-muting the same users leaves stale heap entries behind
+    if len(self.heap) > 2 * sum(map(len, self.chats.values())) + 64:
+      self.heap = [
+        (until, chat_id, user_id, kind)
+        for chat_id, restrictions in self.chats.items()
+        for (user_id, kind), (until, _) in restrictions.items() if until is not None
+      ]
+      heapq.heapify(self.heap)
+
+  def _pop_expired(self, now):
+    expired = []
+    while self.heap and self.heap[0][0] <= now:
+      until, chat_id, user_id, kind = heapq.heappop(self.heap)
+      entry = self.chats.get(chat_id, {}).get((user_id, kind))
+      if entry and entry[0] == until: # not replaced or lifted since
+        self.remove(chat_id, user_id, kind)
+        expired.append((chat_id, user_id, kind))
+    return expired
+
+  async def run(self, on_expire):
+    # on_expire(chat_id, user_id, kind) -> coroutine lifting the restriction in Telegram
+    self.wakeup = asyncio.Event()
+    while True:
+      for chat_id, user_id, kind in self._pop_expired(time.time()):
+        task = asyncio.create_task(on_expire(chat_id, user_id, kind))
+        self.lifting.add(task)
+        task.add_done_callback(self.lifting.discard)
+      self.wakeup.clear()
+      timeout = max(self.heap[0][0] - time.time(), 0) if self.heap else None
+      try:
+        await asyncio.wait_for(self.wakeup.wait(), timeout)
+      except asyncio.TimeoutError:
+        pass
+
+  def start(self, on_expire):
+    self.task = asyncio.create_task(self.run(on_expire))
+
+  async def close(self):
+    if self.task:
+      self.task.cancel()
+      self.task = None
@@ -0,0 +1,40 @@
+from contextlib import contextmanager
+import os
+import shutil
+import uuid
+
+class QuotaExceeded(Exception):
+  # no disk space left for a new job
+  pass
+
+class ScratchSpace:
+  # job-scoped directories for media files, so parallel jobs never share a path
+  # a plain quota: every job reserves the bytes it may write until it ends, nothing on disk is measured or evicted
+  # (a job's directory is removed when it ends, so there is nothing to evict)
+  def __init__(self, root='media_tmp', quota=1024 * 1024 * 1024, job_size=100 * 1024 * 1024):
+    self.root = root
+    self.quota = quota # bytes for all job directories
+    self.job_size = job_size # reserved for a job of unknown size
+    self.used = 0 # bytes reserved by jobs holding a directory, queued ones included
+
+  def sweep(self):
+    # remove files left by a previous run (crash, kill -9)
+    shutil.rmtree(self.root, ignore_errors=True)
+    os.makedirs(self.root, exist_ok=True)
+
+  @contextmanager
+  def job(self, size=None):
+    # unique directory for one request, removed on success, error or cancellation
+    # size: expected bytes of the media, room is kept for the download and a converted copy
+    reserved = 2 * size if size else self.job_size
+    if self.used and self.used + reserved > self.quota:
+      raise QuotaExceeded() # with nothing reserved any job gets in, even one bigger than the quota
+
+    path = os.path.join(self.root, uuid.uuid4().hex)
+    os.makedirs(path)
+    self.used += reserved
+    try:
+      yield path
+    finally:
+      self.used -= reserved
+      shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,40 @@
+# Post a synthetic text message to a locally running webhook server
+# run: python scripts/post_update.py "/weather Riga" [--url http://127.0.0.1:8080/webhook] [--chat -100] [--secret ...]
+import argparse
+import itertools
+import json
+import time
+import urllib.request
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('text')
+  parser.add_argument('--url', default='http://127.0.0.1:8080/webhook')
+  parser.add_argument('--secret', default='')
+  parser.add_argument('--chat', type=int, default=-100)
+  parser.add_argument('--user', type=int, default=1)
+  parser.add_argument('--count', type=int, default=1)
+  args = parser.parse_args()
+
+  ids = itertools.count(int(time.time() * 1000))
+  for _ in range(args.count):
+    message = {
+      'message_id': next(ids),
+      'date': int(time.time()),
+      'chat': {'id': args.chat, 'type': 'private' if args.chat > 0 else 'supergroup'},
+      'from': {'id': args.user, 'is_bot': False, 'first_name': 'Test', 'username': f'user{args.user}'},
+      'text': args.text,
+    }
+    if args.text.startswith('/'):
+      message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(args.text.split()[0])}]
+
+    request = urllib.request.Request(
+      args.url,
+      data=json.dumps({'update_id': next(ids), 'message': message}).encode(),
+      headers={'Content-Type': 'application/json', 'X-Telegram-Bot-Api-Secret-Token': args.secret},
+    )
+    with urllib.request.urlopen(request) as response:
+      print(response.status)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,190 @@
+import asyncio
+import sqlite3
+import threading
+
+class WriteBehindStorage:
+  # chat settings and activity counters, writes are buffered and flushed in batches
+  # subclasses provide read_languages(), read_activity(chat_id), read_restrictions(),
+  # write(messages, languages, restrictions) and disconnect()
+  def __init__(self, flush_interval=5):
+    self.flush_interval = flush_interval # seconds between batches
+    self.pending_messages = {} # chat_id -> {user_id: [username, new messages]}
+    self.pending_languages = {} # chat_id -> language
+    self.pending_restrictions = {} # (chat_id, user_id, kind) -> (until, name), None - lifted
+    self.flushes = 0 # batches taken out of the buffers so far
+    self.flushing = None # future done when the running flush has written its batch (or put it back)
+    self.task = None
+
+  async def load_languages(self):
+    languages = await self.read_languages()
+    languages.update(self.pending_languages)
+    return languages
+
+  async def load_activity(self, chat_id):
+    # [(user_id, username, messages)] of one chat, including counts not flushed yet
+    while True:
+      if self.flushing:
+        await asyncio.shield(self.flushing) # its batch is either stored or back in the buffer after that
+      flushes = self.flushes
+      stored = await self.read_activity(chat_id)
+      if flushes == self.flushes:
+        break # no batch left the buffer during the read, so the buffer has everything the read could not see
+
+    rows = {user_id: [username, messages] for user_id, username, messages in stored}
+    for user_id, (username, count) in self.pending_messages.get(chat_id, {}).items():
+      row = rows.setdefault(user_id, [username, 0])
+      row[0] = username
+      row[1] += count
+    return [(user_id, username, messages) for user_id, (username, messages) in rows.items()]
+
+  async def load_restrictions(self):
+    # [(chat_id, user_id, kind, until, name)] of mutes and bans the bot is tracking
+    rows = {(chat_id, user_id, kind): (until, name) for chat_id, user_id, kind, until, name in await self.read_restrictions()}
+    for key, value in self.pending_restrictions.items():
+      if value is None:
+        rows.pop(key, None)
+      else:
+        rows[key] = value
+    return [(*key, until, name) for key, (until, name) in rows.items()]
+
+  def set_language(self, chat_id, lang):
+    self.pending_languages[chat_id] = lang
+
+  def set_restriction(self, chat_id, user_id, kind, until, name):
+    self.pending_restrictions[(chat_id, user_id, kind)] = (until, name)
+
+  def delete_restriction(self, chat_id, user_id, kind):
+    self.pending_restrictions[(chat_id, user_id, kind)] = None
+
+  def count_message(self, chat_id, user_id, username):
+    # only touches memory, the database gets the sum on the next flush
+    users = self.pending_messages.get(chat_id)
+    if users is None:
+      users = self.pending_messages[chat_id] = {}
+    entry = users.get(user_id)
+    if entry:
+      entry[0] = username
+      entry[1] += 1
+    else:
+      users[user_id] = [username, 1]
+
+  async def flush(self):
+    # one transaction for everything buffered since the last flush
+    if not self.pending_messages and not self.pending_languages and not self.pending_restrictions:
+      return
+
+    messages, self.pending_messages = self.pending_messages, {}
+    languages, self.pending_languages = self.pending_languages, {}
+    restrictions, self.pending_restrictions = self.pending_restrictions, {}
+    self.flushes += 1
+    self.flushing = asyncio.get_running_loop().create_future()
+    try:
+      await self.write(messages, languages, restrictions)
+    except Exception as e:
+      print(f'Storage flush error: {e}')
+      # keep the batch for the next try, newer values win
+      for chat_id, users in messages.items():
+        pending = self.pending_messages.setdefault(chat_id, {})
+        for user_id, (username, count) in users.items():
+          entry = pending.setdefault(user_id, [username, 0])
+          entry[1] += count
+      for chat_id, lang in languages.items():
+        self.pending_languages.setdefault(chat_id, lang)
+      for key, value in restrictions.items():
+        self.pending_restrictions.setdefault(key, value)
+    finally:
+      self.flushing.set_result(None)
+      self.flushing = None
+
+  async def run(self):
+    while True:
+      await asyncio.sleep(self.flush_interval)
+      await self.flush()
+
+  def start(self):
+    self.task = asyncio.create_task(self.run())
+
+  async def close(self):
+    # graceful shutdown, nothing buffered is lost
+    if self.task:
+      self.task.cancel()
+      try:
+        await self.task
+      except asyncio.CancelledError:
+        pass
+      self.task = None
+    await self.flush()
+    await self.disconnect()
+
+class Storage(WriteBehindStorage):
+  # SQLite file, for a single bot process
+  def __init__(self, path='bot.db', flush_interval=5):
+    super().__init__(flush_interval)
+    self.lock = threading.Lock() # batches are written from a worker thread
+    self.db = sqlite3.connect(path, check_same_thread=False)
+    self.db.executescript('''
+      CREATE TABLE IF NOT EXISTS chat_languages (
+        chat_id INTEGER PRIMARY KEY,
+        lang TEXT NOT NULL
+      );
+      CREATE TABLE IF NOT EXISTS activity (
+        chat_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        username TEXT,
+        messages INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (chat_id, user_id)
+      );
+      CREATE TABLE IF NOT EXISTS restrictions (
+        chat_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        until REAL,
+        name TEXT,
+        PRIMARY KEY (chat_id, user_id, kind)
+      );
+    ''')
+
+  def _read(self, query, *args):
+    with self.lock: # waits for a batch being written, in the worker thread instead of the event loop
+      return self.db.execute(query, args).fetchall()
+
+  async def read_languages(self):
+    return dict(await asyncio.to_thread(self._read, 'SELECT chat_id, lang FROM chat_languages'))
+
+  async def read_activity(self, chat_id):
+    return await asyncio.to_thread(self._read, 'SELECT user_id, username, messages FROM activity WHERE chat_id = ?', chat_id)
+
+  async def read_restrictions(self):
+    return await asyncio.to_thread(self._read, 'SELECT chat_id, user_id, kind, until, name FROM restrictions')
+
+  def _write(self, messages, languages, restrictions):
+    with self.lock, self.db:
+      self.db.executemany(
+        'INSERT INTO chat_languages (chat_id, lang) VALUES (?, ?) '
+        'ON CONFLICT (chat_id) DO UPDATE SET lang = excluded.lang',
+        languages.items()
+      )
+      self.db.executemany(
+        'INSERT INTO activity (chat_id, user_id, username, messages) VALUES (?, ?, ?, ?) '
+        'ON CONFLICT (chat_id, user_id) DO UPDATE SET '
+        'username = excluded.username, messages = messages + excluded.messages',
+        [
+          (chat_id, user_id, username, count)
+          for chat_id, users in messages.items() for user_id, (username, count) in users.items()
+        ]
+      )
+      self.db.executemany(
+        'DELETE FROM restrictions WHERE chat_id = ? AND user_id = ? AND kind = ?',
+        [key for key, value in restrictions.items() if value is None]
+      )
+      self.db.executemany(
+        'INSERT OR REPLACE INTO restrictions (chat_id, user_id, kind, until, name) VALUES (?, ?, ?, ?, ?)',
+        [(*key, *value) for key, value in restrictions.items() if value is not None]
+      )
+
+  async def write(self, messages, languages, restrictions):
+    await asyncio.to_thread(self._write, messages, languages, restrictions)
+
+  async def disconnect(self):
+    with self.lock:
+      self.db.close()
@@ -0,0 +1,120 @@
+from media_cache import TIKTOK_ID
+from urllib.parse import urljoin
+import aiohttp
+import asyncio
+import re
+import time
+
+# Every TikTok video link in a message: full links and vm./vt./t/ short links
+TIKTOK_URL = re.compile(
+  r'(?:https?://)?(?:'
+  r'(?:www\.|m\.)?tiktok\.com/(?:@[\w.-]*/video/\d+|v/\d+|t/\w+)'
+  r'|(?:vm|vt)\.tiktok\.com/\w+'
+  r')'
+)
+
+def video_url(video_id):
+  # the form yt-dlp and media_cache both understand
+  return f'https://www.tiktok.com/@_/video/{video_id}'
+
+class TikTokLinks:
+  # finds TikTok videos in messages; short links are resolved to video IDs once and remembered
+  def __init__(self, timeout=5, cache_ttl=24 * 3600, cache_size=10000, dedup_window=600, dedup_size=10000, max_redirects=5):
+    self.timeout = aiohttp.ClientTimeout(total=timeout)
+    self.cache_ttl = cache_ttl # seconds, a short link always points to the same video
+    self.cache_size = cache_size
+    self.dedup_window = dedup_window # seconds the same video is not downloaded again in a chat
+    self.dedup_size = dedup_size
+    self.max_redirects = max_redirects
+    self.cache = {} # short link -> (expires, video ID or None)
+    self.inflight = {} # short link -> running resolve
+    self.posted = {} # (chat_id, video ID) -> time it was posted, oldest first
+    self.session = None
+
+  async def start(self):
+    self.session = aiohttp.ClientSession(timeout=self.timeout)
+
+  async def close(self):
+    if self.session:
+      await self.session.close()
+      self.session = None
+
+  def extract(self, text):
+    # links in the order they appear, each once
+    if 'tiktok.com' not in text:
+      return [] # almost every message, no regex run
+    return list(dict.fromkeys(TIKTOK_URL.findall(text)))
+
+  async def video_id(self, link):
+    # None if the link leads to no video
+    match = TIKTOK_ID.search(link)
+    if match:
+      return match.group(1)
+
+    entry = self.cache.get(link)
+    if entry and entry[0] > time.monotonic():
+      return entry[1]
+    task = self.inflight.get(link)
+    if not task:
+      task = asyncio.ensure_future(self._resolve_and_store(link))
+      self.inflight[link] = task
+      task.add_done_callback(lambda _: self.inflight.pop(link, None))
+    return await asyncio.shield(task)
+
+  async def _resolve_and_store(self, link):
+    video_id = await self.resolve(link)
+    self.cache.pop(link, None)
+    self.cache[link] = (time.monotonic() + self.cache_ttl, video_id)
+    while len(self.cache) > self.cache_size:
+      del self.cache[next(iter(self.cache))]
+    return video_id
+
+  async def resolve(self, link):
+    # follows redirects without loading the pages
+    url = link if link.startswith('http') else f'https://{link}'
+    for _ in range(self.max_redirects):
+      match = TIKTOK_ID.search(url)
+      if match:
+        return match.group(1)
+      async with self.session.get(url, allow_redirects=False) as response:
+        location = response.headers.get('Location')
+      if not location:
+        return None
+      url = urljoin(url, location)
+    return None
+
+  async def canonical(self, link):
+    # video URL for the download, the link itself if it can't be resolved now
+    try:
+      video_id = await self.video_id(link)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+      print(f'TikTok link error: {e}')
+      return link, None
+    return (video_url(video_id), video_id) if video_id else (link, None)
+
+  def seen(self, chat_id, video_id):
+    # True if the video was posted in the chat within the window, otherwise remembers it
+    now = time.monotonic()
+    while self.posted:
+      key, posted = next(iter(self.posted.items()))
+      if now - posted < self.dedup_window and len(self.posted) <= self.dedup_size:
+        break
+      del self.posted[key]
+
+    if (chat_id, video_id) in self.posted:
+      return True
+    self.posted[(chat_id, video_id)] = now
+    return False
+
+  def forget(self, chat_id, video_id):
+    # the download failed, posting it again should retry
+    self.posted.pop((chat_id, video_id), None)
+
+  async def new_videos(self, chat_id, text):
+    # [(url, video ID)] of the message, without videos this chat got recently
+    videos = []
+    for link in self.extract(text):
+      url, video_id = await self.canonical(link)
+      if not self.seen(chat_id, video_id or url):
+        videos.append((url, video_id or url))
+    return videos
@@ -0,0 +1,120 @@
+from urllib.parse import quote
+import asyncio
+import re
+import time
+import aiohttp
+
+VISUAL_CROSSING_URL = 'https://weather.visualcrossing.com/VisualCrossingWebServices/rest/services/timeline'
+
+def normalize_location(location):
+  # 'Riga ,  LV' and 'riga, lv' are the same place
+  return re.sub(r'\s*,\s*', ',', ' '.join(location.lower().split()))
+
+class WeatherError(Exception):
+  # the API refused the request (bad location, key, quota), retrying won't help
+  pass
+
+class RetryableError(Exception):
+  # server side trouble, worth another try
+  pass
+
+class WeatherClient:
+  # Visual Crossing over one shared keep-alive session
+  def __init__(self, api_key, base_url=VISUAL_CROSSING_URL, timeout=10, retries=3, backoff=0.5,
+               cache_ttl=600, cache_size=1000):
+    self.api_key = api_key
+    self.base_url = base_url.rstrip('/')
+    self.timeout = timeout # seconds for the whole request
+    self.retries = retries # attempts
+    self.backoff = backoff # first pause between attempts, doubles every time
+    self.session = None
+
+    # answers cache, saves the paid API quota
+    self.cache_ttl = cache_ttl # seconds
+    self.cache_size = cache_size # places
+    self.cache = {} # resolved place -> (expires, data)
+    self.aliases = {} # what users typed -> resolved place
+    self.inflight = {} # location -> running request, identical lookups wait for it
+    self.hits = 0
+    self.misses = 0
+    self.coalesced = 0
+
+  async def start(self):
+    self.session = aiohttp.ClientSession(
+      connector=aiohttp.TCPConnector(limit=20, keepalive_timeout=60, ttl_dns_cache=300),
+      timeout=aiohttp.ClientTimeout(total=self.timeout),
+    )
+
+  async def close(self):
+    if self.session:
+      await self.session.close()
+      self.session = None
+
+  async def fetch(self, location):
+    # raw API answer for the current conditions
+    url = f'{self.base_url}/{quote(location, safe="")}/today'
+    params = {
+      'unitGroup': 'metric',
+      'include': 'current',
+      'key': self.api_key,
+      'contentType': 'json'
+    }
+
+    for attempt in range(self.retries):
+      try:
+        async with self.session.get(url, params=params) as response:
+          if response.status == 429 or response.status >= 500:
+            raise RetryableError(f'HTTP {response.status}')
+          if response.status >= 400:
+            raise WeatherError((await response.text()).strip() or f'HTTP {response.status}')
+          return await response.json(content_type=None)
+      except (aiohttp.ClientConnectionError, asyncio.TimeoutError, RetryableError):
+        if attempt == self.retries - 1:
+          raise
+        await asyncio.sleep(self.backoff * 2 ** attempt)
+
+  async def get(self, location):
+    # cached fetch, concurrent lookups of one place share a single request
+    key = normalize_location(location)
+    entry = self.cache.get(self.aliases.get(key, key))
+    if entry and entry[0] > time.monotonic():
+      self.hits += 1
+      return entry[1]
+
+    task = self.inflight.get(key)
+    if task:
+      self.coalesced += 1
+    else:
+      self.misses += 1
+      task = asyncio.ensure_future(self._fetch_and_store(key, location))
+      self.inflight[key] = task
+      task.add_done_callback(lambda _: self.inflight.pop(key, None))
+    return await asyncio.shield(task) # one impatient user must not cancel it for everybody
+
+  async def _fetch_and_store(self, key, location):
+    data = await self.fetch(location)
+    if 'currentConditions' not in data:
+      return data
+
+    place = normalize_location(data.get('resolvedAddress') or key)
+    self.cache.pop(place, None) # move to the end, the oldest entry goes first
+    self.cache[place] = (time.monotonic() + self.cache_ttl, data)
+    self.aliases.pop(key, None)
+    self.aliases[key] = place
+    self.aliases.setdefault(place, place)
+
+    while len(self.cache) > self.cache_size:
+      del self.cache[next(iter(self.cache))]
+    while len(self.aliases) > self.cache_size * 4:
+      del self.aliases[next(iter(self.aliases))]
+    return data
+
+  def stats(self):
+    lookups = self.hits + self.misses + self.coalesced
+    return {
+      'hits': self.hits,
+      'misses': self.misses,
+      'coalesced': self.coalesced,
+      'hit_rate': (self.hits + self.coalesced) / lookups if lookups else 0.0,
+      'entries': len(self.cache),
+    }
@@ -0,0 +1,62 @@
+from aiohttp import web
+from aiogram.types import Update
+import asyncio
+import hmac
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+class WebhookServer:
+  # receives updates over http and feeds them to the dispatcher, a limited number at a time
+  def __init__(self, dp, bot, path='/webhook', secret=None, concurrency=100):
+    self.dp = dp
+    self.bot = bot
+    self.path = path
+    self.secret = secret
+    self.slots = asyncio.Semaphore(concurrency) # updates processed at once
+    self.tasks = set()
+    self.draining = False
+
+  def app(self):
+    app = web.Application()
+    app.router.add_post(self.path, self.handle)
+    return app
+
+  async def handle(self, request):
+    if self.draining:
+      return web.Response(status=503) # telegram will deliver it again later
+    if self.secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ''), self.secret):
+      return web.Response(status=401)
+
+    try:
+      update = Update.model_validate(await request.json(), context={'bot': self.bot})
+    except Exception:
+      return web.Response(status=400)
+
+    # full: the answer waits, so telegram slows down instead of us piling up tasks
+    await self.slots.acquire()
+    task = asyncio.create_task(self.process(update))
+    self.tasks.add(task)
+    task.add_done_callback(self.tasks.discard)
+    return web.Response()
+
+  async def process(self, update):
+    held = True
+    def on_hold():
+      # queued behind an earlier update of its chat, the slot can serve another chat meanwhile
+      nonlocal held
+      if held:
+        held = False
+        self.slots.release()
+
+    try:
+      await self.dp.feed_update(self.bot, update, on_hold=on_hold)
+    except Exception as e:
+      print(f'Update error: {e}')
+    finally:
+      on_hold()
+
+  async def drain(self, timeout=30):
+    # stop taking updates and let the running ones finish
+    self.draining = True
+    if self.tasks:
+      await asyncio.wait(set(self.tasks), timeout=timeout)
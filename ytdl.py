@@ -0,0 +1,102 @@
+from contextlib import contextmanager
+import os
+import threading
+
+COOKIE_FILE = os.path.join(os.getcwd(), 'cookies.txt') # logged-in session for TikTok
+
+# Options of every YoutubeDL, per-request ones (outtmpl, format, hooks) are set by Downloaders.use()
+PROFILES = {
+  'audio': { # source audio, the bot converts it while uploading if needed
+    'format': 'bestaudio[ext=m4a]/bestaudio/best',
+  },
+  'audio_mp3': {
+    'format': 'bestaudio/best',
+    'postprocessors': [{
+      'key': 'FFmpegExtractAudio',
+      'preferredcodec': 'mp3',
+      'preferredquality': '192',
+    }],
+  },
+  'tiktok': {
+    'format': 'mp4',
+    'writesubtitles': True,
+    'writeinjson': True,
+    'skip_download': False,
+    'cookiefile': COOKIE_FILE,
+  },
+  'probe': {},
+  'probe_tiktok': {
+    'cookiefile': COOKIE_FILE,
+  },
+}
+
+# Extractors loaded when an instance is created, so the first request does not pay for it
+WARM_EXTRACTORS = {
+  'audio': ('Youtube', 'YoutubeSearch'),
+  'audio_mp3': ('Youtube', 'YoutubeSearch'),
+  'tiktok': ('TikTok', 'TikTokVM'),
+  'probe': ('Youtube', 'YoutubeSearch'),
+  'probe_tiktok': ('TikTok', 'TikTokVM'),
+}
+
+class Downloaders:
+  # long-lived YoutubeDL instances, one per profile in every thread (pool processes have one thread doing jobs):
+  # extractors, the parsed cookie file and open connections are kept between requests
+  def __init__(self, recycle_after=50):
+    self.recycle_after = recycle_after # jobs before an instance is replaced, contains leaks in yt-dlp state
+    self.local = threading.local()
+    self.created = 0
+
+  def _instances(self):
+    if not hasattr(self.local, 'instances'):
+      self.local.instances = {} # profile -> [YoutubeDL, jobs done, compiled format selectors]
+    return self.local.instances
+
+  def _create(self, profile):
+    from yt_dlp import YoutubeDL # heavy, imported by the first job instead of at bot start
+    ydl = YoutubeDL({'quiet': True, 'noprogress': True, **PROFILES[profile]})
+    for key in WARM_EXTRACTORS.get(profile, ()):
+      ydl.get_info_extractor(key)
+    self.created += 1
+    return [ydl, 0, {}]
+
+  def warm(self, *profiles):
+    # create the instances now (worker start) instead of on the first request
+    instances = self._instances()
+    for profile in profiles:
+      if profile not in instances:
+        instances[profile] = self._create(profile)
+
+  def close(self):
+    for ydl, _, _ in self._instances().values():
+      ydl.close() # saves cookies
+    self._instances().clear()
+
+  @contextmanager
+  def use(self, profile, outtmpl=None, format=None, hooks=()):
+    # an instance set up for one request, recycled after recycle_after requests
+    instances = self._instances()
+    entry = instances.get(profile)
+    if entry is None or entry[1] >= self.recycle_after:
+      if entry:
+        entry[0].close()
+      entry = instances[profile] = self._create(profile)
+    ydl, _, selectors = entry
+    entry[1] += 1
+
+    if outtmpl:
+      ydl.params['outtmpl']['default'] = outtmpl
+    format = format or PROFILES[profile].get('format')
+    if format:
+      if format not in selectors:
+        selectors[format] = ydl.build_format_selector(format)
+      ydl.format_selector = selectors[format]
+    ydl._progress_hooks[:] = hooks
+    ydl._num_downloads = 0
+    ydl._playlist_urls.clear()
+    try:
+      yield ydl
+    finally:
+      ydl._progress_hooks.clear() # the hook holds the job
+
+downloaders = Downloaders() # used by pool processes and probe threads